@@ -8,7 +8,10 @@ from .images import (
 from .videos import (
     create_video_thumbnail,
     create_gif_preview,
-    convert_to_hls
+    convert_to_hls,
+    convert_to_hls_ladder,
+    create_all_derivatives,
+    probe_streams
 )
 from .utils import get_media_mimetype
 
@@ -17,6 +20,9 @@ __all__ = [
     "create_video_thumbnail",
     "create_gif_preview",
     "convert_to_hls",
+    "convert_to_hls_ladder",
+    "create_all_derivatives",
+    "probe_streams",
     "get_media_mimetype",
     "get_image_orientation",
 ]
@@ -0,0 +1,78 @@
+# _frame_grab.py
+#
+# Helpers for runners that serve create_video_thumbnail commands in-process
+# (NvCodecRunner, PyAVRunner) instead of spawning ffmpeg.
+
+import math
+from pathlib import Path
+from typing import List, Optional, NamedTuple
+from PIL import Image
+from ._fs import _ensure_dir
+
+
+class FrameGrab(NamedTuple):
+    """A single-frame extraction parsed from an ffmpeg command."""
+    input_path: str
+    t: float
+    filters: List[str]
+    output_path: str
+    exact: bool = True
+
+
+def parse_frame_grab(cmd: List[str]) -> Optional[FrameGrab]:
+    """
+    Recognise the command built by `create_video_thumbnail`
+    (`-ss T -i IN [-vf ...] -frames:v 1 ... OUT`) and return its parts.
+    `exact` is False for keyframe grabs (`-noaccurate_seek`).
+    Returns None for anything else (GIF, HLS, arbitrary commands).
+    """
+    try:
+        if cmd[cmd.index("-frames:v") + 1] != "1":
+            return None
+        i = cmd.index("-i")
+        if cmd.count("-i") != 1 or "-ss" not in cmd[:i]:
+            return None
+        t = float(cmd[cmd.index("-ss") + 1])
+        filters = cmd[cmd.index("-vf") + 1].split(",") if "-vf" in cmd else []
+        return FrameGrab(cmd[i + 1], t, filters, cmd[-1], "-noaccurate_seek" not in cmd[:i])
+    except (ValueError, IndexError):
+        return None
+
+
+def apply_filters(img: Image.Image, filters: List[str]) -> Optional[Image.Image]:
+    """
+    Apply the subset of ffmpeg video filters used for thumbnails
+    (transpose, hflip/vflip, scale=...:increase, crop) to a PIL image.
+    Returns None if a filter is not supported, so the caller can fall back.
+    """
+    for f in filters:
+        name, _, args = f.partition("=")
+        if f == "transpose=1":
+            img = img.transpose(Image.Transpose.ROTATE_270)
+        elif f == "transpose=2":
+            img = img.transpose(Image.Transpose.ROTATE_90)
+        elif f == "hflip":
+            img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        elif f == "vflip":
+            img = img.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        elif name == "scale" and args.endswith(":force_original_aspect_ratio=increase"):
+            w, h = (int(v) for v in args.split(":")[:2])
+            ratio = max(w / img.width, h / img.height)
+            img = img.resize(
+                (max(w, math.ceil(img.width * ratio)), max(h, math.ceil(img.height * ratio))),
+                Image.LANCZOS,
+            )
+        elif name == "crop":
+            w, h = (int(v) for v in args.split(":")[:2])
+            left = (img.width - w) // 2
+            top = (img.height - h) // 2
+            img = img.crop((left, top, left + w, top + h))
+        else:
+            return None
+    return img
+
+
+def save_frame(img: Image.Image, output_path: str) -> None:
+    """Write a grabbed frame as a high-quality JPEG, creating its directory."""
+    _ensure_dir(Path(output_path).parent)
+    img.convert("RGB").save(output_path, format="JPEG", quality=95)
@@ -0,0 +1,33 @@
+# _fs.py
+
+import os
+import threading
+from pathlib import Path
+from typing import Set
+
+# Directories this process has already created (or found existing).
+# Cleared wholesale once it reaches _MKDIR_CACHE_MAX so long-running
+# workers writing to per-job directories don't grow it without bound.
+_MKDIR_CACHE: Set[str] = set()
+_MKDIR_CACHE_MAX = 4096
+_MKDIR_LOCK = threading.Lock()
+
+
+def _ensure_dir(path: Path) -> None:
+    """
+    `mkdir -p` for output directories. A directory already ensured by this
+    process is only re-checked with a single stat(); if it has been removed
+    since, the entry is dropped and the directory created again. Errors from
+    mkdir propagate unchanged.
+    """
+    key = str(path)
+    if key in _MKDIR_CACHE:
+        if os.path.isdir(key):
+            return
+        with _MKDIR_LOCK:
+            _MKDIR_CACHE.discard(key)
+    path.mkdir(parents=True, exist_ok=True)
+    with _MKDIR_LOCK:
+        if len(_MKDIR_CACHE) >= _MKDIR_CACHE_MAX:
+            _MKDIR_CACHE.clear()
+        _MKDIR_CACHE.add(key)
@@ -0,0 +1,81 @@
+# async_ops.py
+#
+# Fire-and-forget thumbnail jobs on a shared process pool (one worker per
+# core). Workers start via forkserver where available, which re-imports the
+# caller's __main__ module in each worker: scripts that submit jobs must keep
+# their top-level code under `if __name__ == "__main__":`.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, Optional
+
+from .images import create_image_thumbnail
+from .videos import create_video_thumbnail
+
+# Created on first submit so importing the package never forks workers.
+_EXECUTOR: Optional[Executor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _mp_context() -> Any:
+    """
+    Start workers via forkserver where the platform has it: they are forked
+    from a small clean server process, so they neither copy the caller's
+    memory nor inherit its threads and held locks (as plain fork would).
+    Like spawn, it imports the main module in each worker, so callers need
+    an `if __name__ == "__main__":` guard.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def _get_executor() -> Executor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=_mp_context())
+    return _EXECUTOR
+
+
+def _image_thumbnail_job(input_path: str, output_path: str, kwargs: Any) -> str:
+    create_image_thumbnail(input_path, output_path, **kwargs)
+    return output_path
+
+
+def _video_thumbnail_job(input_path: str, output_path: str, kwargs: Any) -> str:
+    create_video_thumbnail(input_path, output_path, **kwargs)
+    return output_path
+
+
+def submit_image_thumbnail(input_path: str, output_path: str, **kwargs: Any) -> "Future[str]":
+    """
+    Queue `create_image_thumbnail` on the shared worker pool and return at once.
+
+    The Future resolves to `output_path`, or raises the ThumbnailError of the
+    job. Arguments must be picklable (no injected lambdas). From asyncio code,
+    `await asyncio.wrap_future(fut)`.
+    """
+    return _get_executor().submit(_image_thumbnail_job, input_path, output_path, kwargs)
+
+
+def submit_video_thumbnail(input_path: str, output_path: str, **kwargs: Any) -> "Future[str]":
+    """
+    Queue `create_video_thumbnail` on the shared worker pool and return at once.
+
+    The Future resolves to `output_path`, or raises the ThumbnailError of the
+    job. A custom `runner` must be picklable.
+    """
+    return _get_executor().submit(_video_thumbnail_job, input_path, output_path, kwargs)
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop the worker pool (a later submit starts a new one)."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,40 @@
+# batch.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Task = Tuple[Callable[..., Any], Sequence[Any], Dict[str, Any]]
+
+_CPUS = os.cpu_count() or 1
+
+# Thumbnail/GIF jobs mostly wait on a short-lived ffmpeg process, so the
+# pool can oversubscribe; HLS re-encodes already use every core via x264.
+THUMBNAIL_WORKERS = 2 * _CPUS
+HLS_WORKERS = max(1, _CPUS // 4)
+
+
+def run_tasks(
+    tasks: Iterable[Task],
+    max_workers: Optional[int] = None
+) -> List[Any]:
+    """
+    Run `(fn, args, kwargs)` tasks concurrently on a thread pool and return
+    their results in task order.
+
+    The media functions spend their time blocked on ffmpeg subprocesses or
+    in Pillow's C code (both release the GIL), so threads overlap them well.
+
+    Args:
+      tasks:        Iterable of (callable, positional args, keyword args).
+      max_workers:  Pool size; defaults to os.cpu_count().
+
+    Raises:
+      The first exception raised by a task (in task order), once all tasks finished.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or _CPUS) as ex:
+        futures = [ex.submit(fn, *args, **kwargs) for fn, args, kwargs in tasks]
+    return [f.result() for f in futures]
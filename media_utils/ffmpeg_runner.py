@@ -1,35 +1,192 @@
 # ffmpeg_runner.py
 
+import functools
+import inspect
+import os
+import shutil
 import subprocess
+import threading
 import ffmpeg
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet, Tuple
 
 class FFmpegError(Exception):
     """Raised for errors during FFmpeg operations."""
     pass
 
+
+@functools.lru_cache(maxsize=None)
+def _list_encoders() -> FrozenSet[str]:
+    """
+    Return the names of all encoders compiled into the local ffmpeg build.
+    Runs `ffmpeg -encoders` once per process; returns an empty set if it fails.
+    """
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            check=True, capture_output=True, text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return frozenset()
+
+    names = set()
+    listing = proc.stdout.split("------", 1)[-1]
+    for line in listing.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+@functools.lru_cache(maxsize=None)
+def _which(name: str) -> str:
+    """Absolute path of executable `name` on PATH (cached); `name` if not found."""
+    return shutil.which(name) or name
+
+
+def _stderr_tail(stderr: Any, lines: int = 3) -> str:
+    """Format the last few lines of captured ffmpeg stderr for an error message."""
+    if not stderr:
+        return ""
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode(errors="replace")
+    tail = [l.strip() for l in stderr.splitlines() if l.strip()][-lines:]
+    return ": " + " | ".join(tail) if tail else ""
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_probe_options(probe: Any) -> bool:
+    """
+    True if a `probe` implementation takes ffprobe keyword options. Runner
+    subclasses written against the older `probe(self, path)` signature don't.
+    """
+    try:
+        params = inspect.signature(probe).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(p.kind is p.VAR_KEYWORD or p.name == "select_streams" for p in params)
+
+
+ProbeOptions = Tuple[Tuple[str, Any], ...]
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_probe(path: str, mtime_ns: int, size: int, options: ProbeOptions) -> Dict[str, Any]:
+    """
+    ffprobe `path` with extra ffprobe `options`; memoized on (path, mtime,
+    size, options) so an unchanged file is probed once even when thumbnail,
+    GIF and HLS jobs all inspect it.
+    """
+    return ffmpeg.probe(path, **dict(options))
+
+
+_INFLIGHT: Dict[Tuple[str, int, int, ProbeOptions], Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _shared_probe(path: str, mtime_ns: int, size: int, options: ProbeOptions) -> Dict[str, Any]:
+    """
+    Cached probe that also coalesces concurrent requests: when several
+    batch workers ask for the same file at once (thumbnail, GIF and HLS
+    jobs of one upload), a single ffprobe runs and the others wait for it.
+    """
+    key = (path, mtime_ns, size, options)
+    with _INFLIGHT_LOCK:
+        pending = _INFLIGHT.get(key)
+        if pending is None:
+            _INFLIGHT[key] = fut = Future()
+    if pending is not None:
+        return pending.result()
+
+    try:
+        result = _cached_probe(*key)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+
+
 class FFmpegRunner:
     """
     Encapsulates all FFmpeg interactions for probing and running commands.
+    Stateless: all caches live at module level.
     """
 
-    def probe(self, path: Path) -> Dict[str, Any]:
+    __slots__ = ()
+
+    def probe(self, path: Path, **options: Any) -> Dict[str, Any]:
         """
         Run ffprobe on the given file and return its metadata dict.
-        Raises FFmpegError on failure.
+        Keyword options are passed to ffprobe as flags
+        (e.g. select_streams="v:0" -> `-select_streams v:0`).
+        Results are cached per (path, mtime, size, options) and concurrent
+        probes of the same file share one ffprobe run; treat results as
+        read-only. Raises FFmpegError on failure.
         """
         try:
-            return ffmpeg.probe(str(path))
+            st = os.stat(path)
+        except OSError:
+            st = None
+        try:
+            if st is None:
+                return ffmpeg.probe(str(path), **options)
+            return _shared_probe(
+                os.path.abspath(path), st.st_mtime_ns, st.st_size, tuple(sorted(options.items()))
+            )
         except Exception as e:
             raise FFmpegError(f"probe failed for {path}: {e}") from e
 
+    def probe_video_stream(self, path: Path) -> Dict[str, Any]:
+        """
+        Like `probe`, but ffprobe only reports the first video stream, which
+        keeps the JSON small for files with many audio/subtitle/data streams.
+        Subclasses whose `probe` takes no options get a plain full probe.
+        """
+        if not _accepts_probe_options(type(self).probe):
+            return self.probe(path)
+        return self.probe(path, select_streams="v:0")
+
+    def has_encoder(self, name: str) -> bool:
+        """
+        Return True if the local ffmpeg build provides the encoder `name`
+        (e.g. "h264_nvenc"). The encoder list is probed once and cached.
+        """
+        return name in _list_encoders()
+
     def run(self, cmd: List[str]) -> None:
         """
         Run the given FFmpeg command via subprocess.
-        Raises FFmpegError on non-zero exit.
+        Raises FFmpegError on non-zero exit, including the tail of ffmpeg's stderr.
         """
+        # An absolute executable and close_fds=False let CPython start the
+        # child with posix_spawn instead of fork+exec, which avoids copying
+        # the page tables of a large parent process on every call.
+        # (Python's own descriptors are non-inheritable, so nothing leaks.)
+        argv = [_which(cmd[0]), *cmd[1:]]
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            subprocess.run(
+                argv,
+                check=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                close_fds=False,
+            )
         except subprocess.CalledProcessError as e:
-            raise FFmpegError(f"ffmpeg cmd failed: {' '.join(cmd)}") from e
+            raise FFmpegError(f"ffmpeg cmd failed: {' '.join(cmd)}{_stderr_tail(e.stderr)}") from e
+
+
+@functools.lru_cache(maxsize=None)
+def default_runner() -> FFmpegRunner:
+    """
+    The process-wide FFmpegRunner used when no runner is passed. Binary
+    lookup, encoder list and probe results are all cached at module level,
+    so one instance safely serves every job and thread.
+    """
+    return FFmpegRunner()
@@ -1,8 +1,61 @@
 # images.py
 
-from PIL import Image, ExifTags, ImageOps, UnidentifiedImageError
+import functools
+import io
+import logging
+import os
+import struct
+import PIL
+from PIL import Image, UnidentifiedImageError
 from pathlib import Path
-from typing import Tuple, Callable, Any
+from typing import Tuple, Callable, Any, Optional
+from ._fs import _ensure_dir
+
+logger = logging.getLogger(__name__)
+
+# "vips" makes create_image_thumbnail use libvips shrink-on-load when pyvips
+# is installed; anything else (default "pil") keeps the Pillow path.
+_BACKEND = os.environ.get("MEDIA_THUMB_BACKEND", "pil").strip().lower()
+
+# optional: libvips bindings (pip install pyvips), only loaded when selected
+# so the default backend doesn't pay for libvips on import
+pyvips = None
+if _BACKEND == "vips":
+    try:
+        import pyvips
+    except (ImportError, OSError):
+        pass
+
+# Pillow-SIMD publishes versions like "9.5.0.post1"; its SSE4/AVX2 resampling
+# makes the LANCZOS resize in create_image_thumbnail several times faster.
+PILLOW_SIMD = ".post" in PIL.__version__
+if not PILLOW_SIMD:
+    logger.info(
+        "Pillow %s without SIMD resampling; `pip install pillow-simd` for faster thumbnails",
+        PIL.__version__,
+    )
+
+# EXIF Orientation tag id and the clockwise rotation each code needs
+# (mirrored variants 2/4/5/7 map to the rotation of their unmirrored pair).
+_ORIENTATION_TAG = 0x0112
+
+_ORIENTATION_ROTATION = {
+    1: 0,
+    2: 0,
+    3: 180,
+    4: 180,
+    5: 270,
+    6: 90,
+    7: 90,
+    8: 270
+}
+
+# Modes Image.reduce() handles natively
+_REDUCE_MODES = frozenset({"L", "LA", "RGB", "RGBA", "CMYK"})
+
+_JPEG_SAVE_OPTIONS = {"quality": 85, "optimize": True, "progressive": True}
+# libvips spelling of the same options (metadata is dropped, as with Pillow)
+_VIPS_JPEG_OPTIONS = {"Q": 85, "optimize_coding": True, "interlace": True, "strip": True}
 
 class ThumbnailError(Exception):
     """Raised when thumbnail creation fails."""
@@ -12,21 +65,71 @@ class OrientationError(Exception):
     """Raised when reading image orientation fails."""
     pass
 
+def _fit_image(
+    img: Image.Image,
+    size: Tuple[int,int],
+    method: int = Image.LANCZOS,
+    centering: Tuple[float,float] = (0.5, 0.5)
+) -> Image.Image:
+    """
+    Downscale-oriented replacement for ImageOps.fit (same signature and result
+    geometry): returns `img` resized and center-cropped to exactly `size`.
+
+    JPEGs are drafted to ~2x the target so libjpeg skips most of the IDCT work,
+    and the crop box is passed straight to resize() with reducing_gap=2.0 so
+    most of the shrink happens in a cheap box reduce() before LANCZOS.
+    """
+    draft = getattr(img, "draft", None)
+    if draft is not None:
+        draft("RGB", (size[0] * 2, size[1] * 2))
+
+    w, h = img.size
+    ratio = size[0] / size[1]
+    if w / h > ratio:
+        crop_w, crop_h = h * ratio, h
+    else:
+        crop_w, crop_h = w, w / ratio
+    left = (w - crop_w) * centering[0]
+    top = (h - crop_h) * centering[1]
+
+    # Exact integer shrink (e.g. 1600x1200 -> 400x300): a single box reduce()
+    # over the crop region, skipping the convolution passes entirely.
+    factor = crop_w / size[0]
+    if (
+        method == Image.LANCZOS
+        and img.mode in _REDUCE_MODES
+        and factor >= 2
+        and factor.is_integer()
+        and float(crop_h).is_integer()
+        and crop_h == size[1] * factor
+        and float(left).is_integer()
+        and float(top).is_integer()
+    ):
+        box = (int(left), int(top), int(left + crop_w), int(top + crop_h))
+        return img.reduce(int(factor), box=box)
+
+    box = (left, top, left + crop_w, top + crop_h)
+    if img.mode not in _REDUCE_MODES:
+        # reduce() rejects modes such as I;16, so no reducing_gap pre-shrink
+        return img.resize(size, method, box=box)
+    return img.resize(size, method, box=box, reducing_gap=2.0)
+
 def create_image_thumbnail(
     input_path: str,
-    output_path: str,
+    output_path: Optional[str] = None,
     size: Tuple[int,int] = (320, 240),
     *,
     open_image: Callable[[str], Any] = Image.open,
-    fit_image:  Callable[..., Any] = ImageOps.fit
-):
+    fit_image:  Callable[..., Any] = _fit_image
+) -> Optional[bytes]:
     """
     Create a thumbnail for an image file, exact size, centered & cropped,
     with robust error handling.
 
     Args:
       input_path:    Path to source image.
-      output_path:   Where to save thumbnail.
+      output_path:   Where to save thumbnail; if None, nothing is written and
+                     the JPEG-encoded thumbnail is returned as bytes.
       size:          (width, height) of the final thumbnail.
 
     Keyword Args:
@@ -37,12 +140,17 @@ def create_image_thumbnail(
       ThumbnailError on any failure.
     """
     inp = Path(input_path)
-    out = Path(output_path)
+    out = Path(output_path) if output_path is not None else None
 
-    try:
-        out.parent.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        raise ThumbnailError(f"Could not create output directory '{out.parent}': {e}") from e
+    if out is not None:
+        try:
+            _ensure_dir(out.parent)
+        except Exception as e:
+            raise ThumbnailError(f"Could not create output directory '{out.parent}': {e}") from e
+
+    if (_BACKEND == "vips" and pyvips is not None
+            and open_image is Image.open and fit_image is _fit_image):
+        return _vips_thumbnail(inp, out, size)
 
     try:
         img = open_image(str(inp))
@@ -57,22 +165,70 @@ def create_image_thumbnail(
     except Exception as e:
         raise ThumbnailError(f"Error resizing/cropping image to {size}: {e}") from e
 
-    # 4) Save thumbnail
+    # 4) Save thumbnail (JPEG: optimized Huffman tables, progressive for the
+    # web; other formats keep Pillow's defaults, e.g. PNG optimize is slow)
+    if out is None:
+        try:
+            if thumb.mode not in ("RGB", "L", "CMYK"):
+                thumb = thumb.convert("RGB")
+            buf = io.BytesIO()
+            thumb.save(buf, format="JPEG", **_JPEG_SAVE_OPTIONS)
+            return buf.getvalue()
+        except Exception as e:
+            raise ThumbnailError(f"Could not encode thumbnail: {e}") from e
+
     try:
-        thumb.save(out)
+        if Image.registered_extensions().get(out.suffix.lower()) == "JPEG":
+            thumb.save(out, **_JPEG_SAVE_OPTIONS)
+        else:
+            thumb.save(out)
     except Exception as e:
         raise ThumbnailError(f"Could not save thumbnail to '{out}': {e}") from e
+    return None
+
+
+def _vips_thumbnail(inp: Path, out: Optional[Path], size: Tuple[int,int]) -> Optional[bytes]:
+    """
+    libvips version of the default create_image_thumbnail path: JPEGs are
+    shrunk in the DCT domain while decoding, then centre-cropped to `size`.
+    EXIF orientation is not applied, matching the Pillow path.
+    """
+    w, h = size
+    try:
+        thumb = pyvips.Image.thumbnail(str(inp), w, height=h, crop="centre", no_rotate=True)
+    except pyvips.Error as e:
+        raise ThumbnailError(f"Cannot open image '{inp}': {e}") from e
+
+    if out is None:
+        try:
+            if thumb.hasalpha():
+                thumb = thumb.flatten()
+            return thumb.jpegsave_buffer(**_VIPS_JPEG_OPTIONS)
+        except pyvips.Error as e:
+            raise ThumbnailError(f"Could not encode thumbnail: {e}") from e
+
+    try:
+        if out.suffix.lower() in (".jpg", ".jpeg"):
+            thumb.jpegsave(str(out), **_VIPS_JPEG_OPTIONS)
+        else:
+            thumb.write_to_file(str(out))
+    except pyvips.Error as e:
+        raise ThumbnailError(f"Could not save thumbnail to '{out}': {e}") from e
+    return None
 
 
 def get_image_orientation(
     path: str,
     *,
-    open_image: Callable[[str], Any] = Image.open
+    open_image: Optional[Callable[[str], Any]] = None
 ) -> int:
     """
     Read the EXIF Orientation tag and return the degrees needed 
     to rotate the image for correct viewing.
 
+    Results are cached per (path, mtime, size), so repeated lookups on an
+    unchanged file do not reopen it.
+
     Returns:
       0: no rotation needed or EXIF tag absent
       90: rotate 90° clockwise
@@ -80,12 +236,110 @@ def get_image_orientation(
       270: rotate 270° clockwise
 
     Keyword Args:
-      open_image: Callable to open an image (injected for testing).
+      open_image: Callable to open an image (injected for testing; uncached).
 
     Raises:
       OrientationError on I/O or EXIF parsing failures.
     """
+    if open_image is not None:
+        return _read_orientation(path, open_image)
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError as e:
+        raise OrientationError(f"Input file not found: '{path}'") from e
+    except OSError as e:
+        raise OrientationError(f"I/O error opening image '{path}': {e}") from e
+    return _orientation_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=1024)
+def _orientation_cached(path: str, mtime_ns: int, size: int) -> int:
+    """Orientation of `path`, memoized on the file's identity (errors are not cached)."""
+    code = _fast_read_orientation(path)
+    if code is not None:
+        return _ORIENTATION_ROTATION.get(code, 0)
+    return _read_orientation(path, Image.open)
+
+
+_HEADER_BYTES = 64 * 1024
+_UINT16_BE = struct.Struct(">H")
+_TIFF_INTS = {
+    b"II": (struct.Struct("<H"), struct.Struct("<I")),
+    b"MM": (struct.Struct(">H"), struct.Struct(">I")),
+}
+_EXIF_HEADER = b"Exif\x00\x00"
+_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+
+
+def _fast_read_orientation(path: str) -> Optional[int]:
+    """
+    Return the raw EXIF Orientation code of a JPEG by walking its markers in
+    the first 64 KiB (1 if the file carries no orientation), without
+    decoding the image. Returns None for non-JPEGs, XMP-only metadata or
+    anything it cannot parse, so the caller falls back to Pillow.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(_HEADER_BYTES)
+        if data[:2] != b"\xff\xd8":
+            return None
+
+        code = None
+        xmp = False
+        pos = 2
+        while True:
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:                       # fill byte
+                pos += 1
+                continue
+            if marker in (0xDA, 0xD9):               # SOS / EOI: metadata is over
+                break
+            if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+                pos += 2
+                continue
+            (length,) = _UINT16_BE.unpack_from(data, pos + 2)
+            end = pos + 2 + length
+            if end > len(data):
+                return None
+            if marker == 0xE1:
+                if code is None and data.startswith(_EXIF_HEADER, pos + 4):
+                    code = _tiff_orientation(data[pos + 10:end])
+                    if code is None:
+                        return None
+                elif data.startswith(_XMP_HEADER, pos + 4):
+                    xmp = True
+            pos = end
+    except (OSError, IndexError, struct.error):
+        return None
 
+    if not code and xmp:
+        return None  # Pillow also honours an XMP tiff:Orientation
+    return code or 1
+
+
+def _tiff_orientation(tiff: bytes) -> Optional[int]:
+    """Orientation code from IFD0 of a TIFF/EXIF block; 0 if absent, None if malformed."""
+    ints = _TIFF_INTS.get(tiff[:2])
+    if ints is None:
+        return None
+    u16, u32 = ints
+    if u16.unpack_from(tiff, 2)[0] != 42:
+        return None
+    ifd = u32.unpack_from(tiff, 4)[0]
+    for i in range(u16.unpack_from(tiff, ifd)[0]):
+        entry = ifd + 2 + 12 * i
+        if u16.unpack_from(tiff, entry)[0] == _ORIENTATION_TAG:
+            if u16.unpack_from(tiff, entry + 2)[0] != 3:   # not a SHORT
+                return None
+            return u16.unpack_from(tiff, entry + 8)[0]
+    return 0
+
+
+def _read_orientation(path: str, open_image: Callable[[str], Any]) -> int:
+    """Open `path` with `open_image` and map its EXIF Orientation to degrees."""
     try:
         img = open_image(path)
     except FileNotFoundError as e:
@@ -98,7 +352,7 @@ def get_image_orientation(
         raise OrientationError(f"Unexpected error opening image '{path}': {e}") from e
 
     try:
-        exif = img._getexif() or {}
+        exif = img.getexif() or {}
     except Exception as e:
         raise OrientationError(f"Error reading EXIF from '{path}': {e}") from e
     finally:
@@ -107,29 +361,10 @@ def get_image_orientation(
         except Exception:
             pass
 
-    if not exif:
-        return 0
-
-    try:
-        orientation_tag = next(
-            tag for tag, name in ExifTags.TAGS.items()
-            if name == "Orientation"
-        )
-    except Exception:
-        return 0
-
+    # Two table lookups: tag -> EXIF code -> degrees (absent tag reads as 1)
     try:
-        raw = exif.get(orientation_tag, 1)
+        raw = exif.get(_ORIENTATION_TAG, 1)
     except Exception as e:
         raise OrientationError(f"Error fetching Orientation tag value: {e}") from e
 
-    return {
-        1: 0,
-        2: 0,
-        3: 180,
-        4: 180,
-        5: 270,
-        6: 90,
-        7: 90,
-        8: 270
-    }.get(raw, 0)
+    return _ORIENTATION_ROTATION.get(raw, 0)
@@ -0,0 +1,98 @@
+# nvcodec_runner.py
+
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+from PIL import Image
+from .ffmpeg_runner import FFmpegRunner
+from ._frame_grab import parse_frame_grab, apply_filters, save_frame
+
+try:  # optional: NVIDIA PyNvVideoCodec bindings (pip install PyNvVideoCodec)
+    import numpy as np
+    import PyNvVideoCodec as nvc
+except ImportError:
+    np = nvc = None
+
+
+class NvCodecRunner(FFmpegRunner):
+    """
+    FFmpegRunner that serves single-frame thumbnail commands with NVDEC via
+    PyNvVideoCodec: the clip is decoded on the GPU and only the requested
+    RGB frame is copied back to host memory. Every other command (GIF
+    palette passes, HLS) and any GPU-side failure falls through to ffmpeg.
+
+    Unlike FFmpegRunner, keyframe grabs (create_video_thumbnail's default
+    exact=False) are not honoured: every grab returns the frame exactly at
+    `t`, as with exact=True. PyNvVideoCodec seeks to the keyframe before `t`
+    and decodes forward on the GPU anyway.
+
+    Each runner keeps one decoder and points it at the next clip instead of
+    creating a new one per thumbnail; decodes on one runner are serialized.
+    """
+
+    __slots__ = ("gpu_id", "_decoder", "_lock")
+
+    def __init__(self, gpu_id: int = 0):
+        self.gpu_id = gpu_id
+        self._decoder: Optional[Tuple[Tuple[str, int, int], Any]] = None   # (file identity, SimpleDecoder)
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # picklable for submit_video_thumbnail; each process opens its own decoder
+        return type(self), (self.gpu_id,)
+
+    @staticmethod
+    def available() -> bool:
+        """Return True if the PyNvVideoCodec bindings are importable."""
+        return nvc is not None
+
+    def run(self, cmd: List[str]) -> None:
+        grab = parse_frame_grab(cmd) if self.available() else None
+        if grab is not None:
+            try:
+                frame = apply_filters(self._decode_frame(grab.input_path, grab.t), grab.filters)
+                if frame is not None:
+                    save_frame(frame, grab.output_path)
+                    return
+            except Exception:
+                pass  # let ffmpeg handle it (and report a proper error)
+        super().run(cmd)
+
+    def _decode_frame(self, path: str, t: float) -> Image.Image:
+        """Decode the frame at `t` seconds on the GPU and return it as RGB."""
+        with self._lock:
+            decoder = self._decoder_for(path)
+            frame = decoder[decoder.get_index_from_time_in_seconds(t)]
+            # fromarray copies RGB data, so the decoder's buffer can be reused
+            return Image.fromarray(np.from_dlpack(frame))
+
+    def _decoder_for(self, path: str) -> Any:
+        """
+        The runner's SimpleDecoder, opened on `path`: reused as-is for the
+        same unchanged clip (path, mtime, size), reconfigured for a new one,
+        and only created from scratch on first use or when reconfiguring
+        fails (e.g. a larger resolution). Call with self._lock held.
+        """
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        if self._decoder is not None:
+            current, decoder = self._decoder
+            if current == key:
+                return decoder
+            self._decoder = None
+            try:
+                decoder.reconfigure_decoder(path)
+            except Exception:
+                pass
+            else:
+                self._decoder = (key, decoder)
+                return decoder
+
+        decoder = nvc.SimpleDecoder(
+            path,
+            gpu_id=self.gpu_id,
+            use_device_memory=False,
+            output_color_type=nvc.OutputColorType.RGB,
+        )
+        self._decoder = (key, decoder)
+        return decoder
@@ -0,0 +1,58 @@
+# pyav_runner.py
+
+from typing import List
+from PIL import Image
+from .ffmpeg_runner import FFmpegRunner
+from ._frame_grab import parse_frame_grab, apply_filters, save_frame
+
+try:  # optional: libav bindings (pip install av)
+    import av
+except ImportError:
+    av = None
+
+
+class PyAVRunner(FFmpegRunner):
+    """
+    FFmpegRunner that serves single-frame thumbnail commands in-process with
+    PyAV (libavformat/libavcodec), skipping the ffmpeg process start-up
+    that dominates short jobs. Seeking matches the command: keyframe grabs
+    decode only the keyframe before `-ss`, exact grabs decode up to `t`.
+    Every other command (GIF, HLS) and any decode failure falls through to ffmpeg.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def available() -> bool:
+        """Return True if PyAV is importable."""
+        return av is not None
+
+    def run(self, cmd: List[str]) -> None:
+        grab = parse_frame_grab(cmd) if self.available() else None
+        if grab is not None:
+            try:
+                frame = apply_filters(self._decode_frame(grab.input_path, grab.t, grab.exact), grab.filters)
+                if frame is not None:
+                    save_frame(frame, grab.output_path)
+                    return
+            except Exception:
+                pass  # let ffmpeg handle it (and report a proper error)
+        super().run(cmd)
+
+    def _decode_frame(self, path: str, t: float, exact: bool) -> Image.Image:
+        """
+        Decode the frame at `t` seconds (or the keyframe before it) as RGB.
+        Raises ValueError if no frame reaches `t` (past the end of the clip).
+        """
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            if not exact:
+                stream.codec_context.skip_frame = "NONKEY"
+            # like -ss, `t` counts from the container's start time
+            target = t + (container.start_time or 0) / av.time_base
+            if t > 0:
+                container.seek(int(target / stream.time_base), stream=stream)
+            for frame in container.decode(stream):
+                if not exact or frame.time is None or frame.time >= target:
+                    return frame.to_image()
+            raise ValueError(f"no video frame at {t}s in {path}")
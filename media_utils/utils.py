@@ -1,29 +1,79 @@
 # utils.py
 
 import mimetypes
-from typing import Optional, Tuple, Callable
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple, Callable
 
 class MimetypeError(Exception):
     """Raised when determining MIME type fails."""
     pass
 
+# mimetypes reads the system MIME databases (/etc/mime.types, the Windows
+# registry) on first use; do that once, lazily, and never at import time.
+# Never re-run init() once the application has used mimetypes: it rebuilds
+# the global database and drops types registered with add_type().
+_INITED = False
+_INIT_LOCK = threading.Lock()
+
+def _ensure_mimetypes_init() -> None:
+    global _INITED
+    if not _INITED:
+        with _INIT_LOCK:
+            if not _INITED:
+                if not mimetypes.inited:
+                    mimetypes.init()
+                _INITED = True
+
+# Lower-cased extension -> MIME type. Only hits are stored, so an extension
+# registered later with mimetypes.add_type() is still picked up; the size is
+# bounded by the known types.
+_MIME_BY_EXT: Dict[str, str] = {}
+
+# "data:", "http:", ... (two or more characters, so a drive letter is not a scheme)
+_URL_SCHEME = re.compile(r"[A-Za-z][A-Za-z0-9+.-]+:")
+
+def _guess_cached(ext: str) -> Optional[str]:
+    """MIME type for a lower-cased extension such as ".png" (memoized when known)."""
+    mime = _MIME_BY_EXT.get(ext)
+    if mime is None:
+        mime = mimetypes.guess_type(f"x{ext}")[0]
+        if mime is not None:
+            _MIME_BY_EXT[ext] = mime
+    return mime
+
 def get_media_mimetype(
     path: str,
     *,
-    guess_fn: Callable[[str], Tuple[Optional[str], Optional[str]]] = mimetypes.guess_type
+    guess_fn: Optional[Callable[[str], Tuple[Optional[str], Optional[str]]]] = None
 ) -> Optional[str]:
     """
     Return the MIME type (e.g., "image/png" or "video/mp4") for a given file path,
     or None if it cannot be determined.
 
+    By default known types are memoized per extension; compound extensions
+    (".tar.gz", ".tgz", ...) and URLs ("data:...", "https://...") go straight
+    to mimetypes.guess_type.
+
     Keyword Args:
-      guess_fn:  Function to use for guessing the type (injected for testing).
+      guess_fn:  Function to use for guessing the type (injected for testing);
+                 bypasses the cache.
 
     Raises:
-      MimetypeError: if the guess_fn itself raises an exception.
+      MimetypeError: if the guess function itself raises an exception.
     """
     try:
-        mime, _ = guess_fn(path)
+        if guess_fn is not None:
+            mime, _ = guess_fn(path)
+        else:
+            _ensure_mimetypes_init()
+            ext = os.path.splitext(path)[1].lower()
+            if (ext in mimetypes.encodings_map or ext in mimetypes.suffix_map
+                    or _URL_SCHEME.match(path)):
+                mime, _ = mimetypes.guess_type(path)
+            else:
+                mime = _guess_cached(ext)
     except Exception as e:
         raise MimetypeError(f"Error guessing MIME type for '{path}': {e}") from e
 
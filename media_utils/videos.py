@@ -1,8 +1,12 @@
 # videos.py
 
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any, List
-from .ffmpeg_runner import FFmpegRunner, FFmpegError
+from types import MappingProxyType
+from typing import Optional, Tuple, Dict, Any, List, Sequence, Mapping, NamedTuple
+from .ffmpeg_runner import FFmpegRunner, FFmpegError, default_runner
+from ._fs import _ensure_dir
 
 class VideoUtilsError(Exception):
     """Base exception for video utilities."""
@@ -20,8 +24,19 @@ class HLSError(VideoUtilsError):
     """Raised when HLS conversion fails."""
     pass
 
+class DerivativesError(VideoUtilsError):
+    """Raised when combined thumbnail/GIF/HLS generation fails."""
+    pass
+
+
+# Every command starts the same way: overwrite outputs, log errors only (no
+# banner or progress stats, so the stderr FFmpegRunner.run captures for its
+# error message stays small even for long encodes) and leave rotation to our
+# own filters; then strip container and stream metadata.
+_FFMPEG_PREFIX = ("ffmpeg", "-y", "-nostats", "-loglevel", "error", "-noautorotate")
+_SANITIZE = ("-map_metadata", "-1", "-map_metadata:s:v:0", "-1")
 
-RESOLUTION_MAP: Dict[str, Tuple[int,int]] = {
+RESOLUTION_MAP: Mapping[str, Tuple[int,int]] = MappingProxyType({
     "8k":   (7680, 4320),
     "4k":   (3840, 2160),
     "1080p": (1920, 1080),
@@ -31,30 +46,193 @@ RESOLUTION_MAP: Dict[str, Tuple[int,int]] = {
     "360p": (640,  360),
     "240p": (426,  240),
     "144p": (256,  144),
-}
+})
+
+_VALID_RES = frozenset(RESOLUTION_MAP)
+
+# (resolution, source is portrait) -> target box, swapped once at import
+_RES_SWAP: Mapping[Tuple[str, bool], Tuple[int,int]] = MappingProxyType({
+    **{(key, False): (w, h) for key, (w, h) in RESOLUTION_MAP.items()},
+    **{(key, True): (h, w) for key, (w, h) in RESOLUTION_MAP.items()},
+})
+
+# Probed rotation -> filter that undoes it (CPU and npp/CUDA variants).
+_ROT_VF: Mapping[int, str] = MappingProxyType({
+    -90: "transpose=1",
+    90: "transpose=2",
+    180: "hflip,vflip",
+    -180: "hflip,vflip",
+})
+_ROT_VF_CUDA: Mapping[int, str] = MappingProxyType({
+    -90: "transpose_npp=clock",
+    90: "transpose_npp=cclock",
+    180: "transpose_npp=clock,transpose_npp=clock",
+    -180: "transpose_npp=clock,transpose_npp=clock",
+})
+
+# Peak video bitrate (kbit/s) per rendition of an HLS ladder; caps CRF/CQ
+# encodes and lets ffmpeg write BANDWIDTH into the master playlist.
+_HLS_MAXRATE_KBPS: Mapping[str, int] = MappingProxyType({
+    "8k":   40000,
+    "4k":   16000,
+    "1080p": 6000,
+    "720p": 3000,
+    "540p": 2000,
+    "480p": 1500,
+    "360p": 1000,
+    "240p":  500,
+    "144p":  300,
+})
+
+class ProbeResult(NamedTuple):
+    """Dimensions and raw rotation (-90, 90, ±180 or 0) of a video stream."""
+    width: int
+    height: int
+    rotation: int
+
+
+_NO_STREAM = ProbeResult(0, 0, 0)
+
 
 def _probe_stream(
     input_path: Path,
     runner: FFmpegRunner
-) -> Tuple[int,int,int]:
+) -> ProbeResult:
     """
     Probe width, height and raw rotation (may be -90, 90, 180, -180).
-    Returns (w, h, rotate). On any error returns (0,0,0).
+    Returns a ProbeResult; on any error ProbeResult(0, 0, 0).
     """
     try:
-        info = runner.probe(input_path)
-        vs = next(s for s in info["streams"] if s.get("codec_type") == "video")
+        info = runner.probe_video_stream(input_path)
+    except Exception:
+        return _NO_STREAM
+    return _video_stream_dims(info)
+
+
+def _video_stream_dims(info: Dict[str, Any]) -> ProbeResult:
+    """ProbeResult of the first video stream in a probe result; (0,0,0) if unusable."""
+    try:
+        vs = next((s for s in info.get("streams", ()) if s.get("codec_type") == "video"), None)
+        if vs is None:
+            return _NO_STREAM
         w = int(vs["width"])
         h = int(vs["height"])
         tags = vs.get("tags", {})
         if "rotate" in tags:
-            return w, h, int(tags["rotate"])
-        for sd in vs.get("side_data_list", []):
+            return ProbeResult(w, h, int(tags["rotate"]))
+        for sd in vs.get("side_data_list", ()):
             if "rotation" in sd:
-                return w, h, int(sd["rotation"])
-        return w, h, 0
+                return ProbeResult(w, h, int(sd["rotation"]))
+        return ProbeResult(w, h, 0)
     except Exception:
-        return 0, 0, 0
+        return _NO_STREAM
+
+
+def probe_streams(
+    paths: Sequence[Path],
+    runner: Optional[FFmpegRunner] = None,
+    max_workers: int = 8
+) -> List[ProbeResult]:
+    """
+    Probe (width, height, rotation) for many files at once, in input order.
+
+    Each probe is an ffprobe subprocess, so the calls overlap on a thread
+    pool; unreadable files yield (0,0,0) just like a single probe.
+    """
+    runner = runner or default_runner()
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        return list(ex.map(lambda p: _probe_stream(p, runner), paths))
+
+
+def _build_vf(
+    raw: int,
+    size: Optional[Tuple[int,int]],
+    auto_rotate: bool,
+    *head: str
+) -> str:
+    """
+    Filter chain for thumbnails and GIFs: the `head` filters, then
+    scale/crop to `size` in the stored orientation, then the rotation fix,
+    so the transpose only touches output-sized frames. "" if there is nothing to do.
+    """
+    rotate = _ROT_VF.get(raw) if auto_rotate else None
+    parts = list(head)
+    if size:
+        w, h = size
+        if rotate and raw in (-90, 90):
+            w, h = h, w
+        parts.append(f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h}")
+    if rotate:
+        parts.append(rotate)
+    return ",".join(parts)
+
+
+def _hls_rotate_filter(raw: int, cuda: bool) -> Optional[str]:
+    """
+    Filter that undoes a probed rotation, using the npp (CUDA) variants
+    when `cuda` is set. Returns None for an unrotated stream.
+    """
+    return (_ROT_VF_CUDA if cuda else _ROT_VF).get(raw)
+
+
+def _hls_scale_filter(tgt_w: int, tgt_h: int, cuda: bool) -> str:
+    """Fit inside tgt_w x tgt_h keeping aspect ratio, with even output dimensions."""
+    if cuda:
+        return f"scale_npp={tgt_w}:{tgt_h}:force_original_aspect_ratio=decrease:force_divisible_by=2"
+    return f"scale={tgt_w}:{tgt_h}:force_original_aspect_ratio=decrease,scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+
+def _hls_encode_args(cuda: bool) -> List[str]:
+    """Codec arguments for re-encoded HLS output: NVENC on GPU, libx264 otherwise."""
+    if cuda:
+        video = ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "0"]
+    else:
+        video = [
+            "-c:v", "libx264", "-preset", "faster", "-crf", "23",
+            "-profile:v", "main", "-pix_fmt", "yuv420p", "-threads", "0",
+        ]
+    return video + ["-c:a", "aac", "-b:a", "128k", "-strict", "-2"]
+
+
+@functools.lru_cache(maxsize=64)
+def _hls_args_template(vf: str, cuda: bool, segment_time: float) -> Tuple[str, ...]:
+    """
+    Path-independent convert_to_hls arguments between the input and the
+    segmenter options: re-encode through `vf`, or stream-copy when it is empty.
+    Jobs with the same parameters share one cached tuple.
+    """
+    if vf:
+        args = ["-vf", vf, "-metadata:s:v:0", "rotate=0", *_hls_encode_args(cuda)]
+    else:
+        args = ["-c", "copy", "-metadata:s:v:0", "rotate=0"]
+    return (
+        *args,
+        "-start_number", "0",
+        "-hls_time", str(segment_time),
+        "-hls_list_size", "0",
+    )
+
+
+def _check_segment_format(segment_format: str) -> None:
+    if segment_format not in ("ts", "fmp4"):
+        raise ValueError(f"Unknown segment_format '{segment_format}'. Valid: ['ts', 'fmp4']")
+
+
+def _hls_segment_args(segments: Path, init_name: str, segment_format: str) -> List[str]:
+    """
+    HLS segmenter options. `segments` is the segment path without extension
+    (containing %d); `init_name` is the fMP4 init segment, next to the playlist.
+    fMP4 uses the lighter CMAF muxer and marks every segment as independently
+    decodable.
+    """
+    if segment_format == "fmp4":
+        return [
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", init_name,
+            "-hls_flags", "independent_segments+temp_file",
+            "-hls_segment_filename", f"{segments}.m4s",
+        ]
+    return ["-hls_segment_filename", f"{segments}.ts"]
 
 
 def create_video_thumbnail(
@@ -64,54 +242,95 @@ def create_video_thumbnail(
     size: Optional[Tuple[int,int]] = None,
     auto_rotate: bool = False,
     *,
-    runner: FFmpegRunner = FFmpegRunner(),
+    exact: bool = False,
+    runner: Optional[FFmpegRunner] = None,
 ):
     """
     Extract a single frame as a thumbnail at time `t`, optionally auto-rotated
     and resized/cropped to `size`. Raises ThumbnailError on any failure.
+
+    By default the frame is the keyframe at or before `t`: only keyframes are
+    decoded, instead of every frame from the previous keyframe up to `t`.
+    If that yields no frame (`t` after the last keyframe) the grab is retried
+    with an accurate seek. Pass `exact=True` for the frame exactly at `t`.
+
+    An injected `runner` must behave like ffmpeg and leave the image at
+    `output_path`: a keyframe grab that writes no file (or an empty one)
+    is treated as "no frame" and retried with an accurate seek.
     """
     inp = Path(input_path)
+    runner = runner or default_runner()
     out = Path(output_path)
 
     try:
-        out.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(out.parent)
     except Exception as e:
         raise ThumbnailError(f"Could not create output directory '{out.parent}': {e}") from e
 
-    _, _, raw = _probe_stream(inp, runner)
+    raw = _probe_stream(inp, runner).rotation
 
-    vf: List[str] = []
-    if auto_rotate and raw in (-90, 90, 180, -180):
-        if raw == -90:
-            vf.append("transpose=1")
-        elif raw == 90:
-            vf.append("transpose=2")
-        else:
-            vf.append("transpose=1,transpose=1")
-    if size:
-        w, h = size
-        vf.append(f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h}")
+    vf = _build_vf(raw, size, auto_rotate)
+
+    if not exact:
+        # ffmpeg leaves an existing file untouched when it encodes nothing
+        try:
+            out.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise ThumbnailError(f"Could not replace '{out}': {e}") from e
+
+    try:
+        runner.run(_thumbnail_cmd(inp, out, t, vf, exact))
+        if not exact and not _has_output(out):
+            # Past the last keyframe a keyframe-only seek decodes nothing, yet
+            # ffmpeg exits 0 ("Output file is empty"); retry with an accurate seek.
+            runner.run(_thumbnail_cmd(inp, out, t, vf, True))
+            if not _has_output(out):
+                raise ThumbnailError(f"Thumbnail creation failed: no frame at {t}s in '{inp}'")
+    except FFmpegError as e:
+        raise ThumbnailError(f"Thumbnail creation failed: {e}") from e
 
+
+def _thumbnail_cmd(inp: Path, out: Path, t: float, vf: str, exact: bool) -> List[str]:
+    """ffmpeg command writing the frame at `t` (or the keyframe before it) as JPEG."""
     cmd = [
-        "ffmpeg", "-y", "-noautorotate",
+        *_FFMPEG_PREFIX,
         "-ss", str(t),
+    ]
+    if not exact:
+        cmd += ["-noaccurate_seek", "-skip_frame", "nokey"]
+    cmd += [
         "-i", str(inp),
-        "-map_metadata", "-1", "-map_metadata:s:v:0", "-1",
+        *_SANITIZE,
     ]
     if vf:
-        cmd += ["-vf", ",".join(vf)]
+        cmd += ["-vf", vf]
     cmd += [
         "-frames:v", "1",
         "-c:v", "mjpeg",
         "-q:v", "2",
-        "-an",
+        "-an", "-sn", "-dn",
         str(out),
     ]
+    return cmd
 
+
+def _has_output(path: Path) -> bool:
+    """True if ffmpeg wrote a non-empty file at `path`."""
     try:
-        runner.run(cmd)
-    except FFmpegError as e:
-        raise ThumbnailError(f"Thumbnail creation failed: {e}") from e
+        return path.stat().st_size > 0
+    except OSError:
+        return False
+
+
+def _palettegen(fps: int) -> str:
+    """
+    GIF palette filter. The palette only needs a colour histogram: sample at
+    most 2 fps at half size, weighting moving regions (stats_mode=diff) to
+    offset the sparser sampling.
+    """
+    return f"fps={min(fps, 2)},scale=iw/2:ih/2:flags=area,palettegen=stats_mode=diff"
 
 
 def create_gif_preview(
@@ -123,44 +342,57 @@ def create_gif_preview(
     size: Optional[Tuple[int,int]] = None,
     auto_rotate: bool = False,
     *,
-    runner: FFmpegRunner = FFmpegRunner()
+    single_pass: bool = True,
+    runner: Optional[FFmpegRunner] = None
 ):
     """
-    Create an optimized GIF preview (two-pass) of a clip from `start` for `duration` seconds.
+    Create an optimized GIF preview of a clip from `start` for `duration` seconds.
+
+    By default palettegen and paletteuse run in one ffmpeg invocation
+    (split filter graph), so the clip is decoded once and no palette file
+    is written. `single_pass=False` keeps the classic two-command flow.
     Raises GIFError on any failure.
     """
     inp = Path(input_path)
+    runner = runner or default_runner()
     out = Path(output_path)
 
     try:
-        out.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(out.parent)
     except Exception as e:
         raise GIFError(f"Could not create output directory '{out.parent}': {e}") from e
 
-    _, _, raw = _probe_stream(inp, runner)
+    raw = _probe_stream(inp, runner).rotation
 
-    vf_parts: List[str] = []
-    if auto_rotate and raw in (-90, 90, 180, -180):
-        if raw == -90:
-            vf_parts.append("transpose=1")
-        elif raw == 90:
-            vf_parts.append("transpose=2")
-        else:
-            vf_parts.append("transpose=1,transpose=1")
-    vf_parts.append(f"fps={fps}")
-    if size:
-        w, h = size
-        vf_parts.append(f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h}")
-    vf = ",".join(vf_parts)
+    # Drop frames first so scale/crop and rotation see as few pixels as possible.
+    vf = _build_vf(raw, size, auto_rotate, f"fps={fps}")
+
+    palettegen = _palettegen(fps)
+
+    if single_pass:
+        cmd = [
+            *_FFMPEG_PREFIX,
+            "-ss", str(start), "-t", str(duration),
+            "-i", str(inp),
+            *_SANITIZE,
+            "-filter_complex", f"[0:v]{vf},split[a][b];[a]{palettegen}[p];[b][p]paletteuse",
+            "-loop", "0",
+            str(out),
+        ]
+        try:
+            runner.run(cmd)
+        except FFmpegError as e:
+            raise GIFError(f"GIF creation failed: {e}") from e
+        return
 
     palette = out.with_suffix(".png")
 
     cmd1 = [
-        "ffmpeg", "-y", "-noautorotate",
+        *_FFMPEG_PREFIX,
         "-ss", str(start), "-t", str(duration),
         "-i", str(inp),
-        "-map_metadata", "-1", "-map_metadata:s:v:0", "-1",
-        "-vf", f"{vf},palettegen",
+        *_SANITIZE,
+        "-vf", f"{vf},{palettegen}",
         str(palette),
     ]
     try:
@@ -169,11 +401,11 @@ def create_gif_preview(
         raise GIFError(f"Palette generation failed: {e}") from e
 
     cmd2 = [
-        "ffmpeg", "-y", "-noautorotate",
+        *_FFMPEG_PREFIX,
         "-ss", str(start), "-t", str(duration),
         "-i", str(inp),
         "-i", str(palette),
-        "-map_metadata", "-1", "-map_metadata:s:v:0", "-1",
+        *_SANITIZE,
         "-filter_complex", f"[0:v]{vf}[x];[x][1:v]paletteuse",
         "-loop", "0",
         str(out),
@@ -189,6 +421,48 @@ def create_gif_preview(
             pass
 
 
+def _hls_cuda_attempts(use_gpu: bool, runner: FFmpegRunner) -> Tuple[bool, ...]:
+    """
+    Values of `cuda` to try in turn for an HLS re-encode. A failed GPU run is
+    retried on the software path: NVDEC cannot decode every input (e.g.
+    4:4:4 or 10-bit H.264), and ffmpeg's silent fallback to CPU decoding
+    then hands host frames to the npp filters, which fail.
+    """
+    if use_gpu and runner.has_encoder("h264_nvenc"):
+        return (True, False)
+    return (False,)
+
+
+def _hls_filters(
+    probe: ProbeResult,
+    resolution: Optional[str],
+    auto_rotate: bool,
+    cuda: bool
+) -> List[str]:
+    """
+    HLS video filters: undo the rotation first, then fit inside the named
+    resolution (never upscaling). Empty when the stream can be copied.
+    Raises ValueError for an unknown resolution.
+    """
+    vf_filters: List[str] = []
+    rotate = _hls_rotate_filter(probe.rotation, cuda) if auto_rotate else None
+    if rotate:
+        vf_filters.append(rotate)
+    if rotate and probe.rotation in (-90, 90):
+        src_w, src_h = probe.height, probe.width
+    else:
+        src_w, src_h = probe.width, probe.height
+
+    if resolution:
+        key = resolution.casefold()
+        if key not in _VALID_RES:
+            raise ValueError(f"Unknown resolution '{resolution}'. Valid: {list(RESOLUTION_MAP)}")
+        tgt_w, tgt_h = _RES_SWAP[key, src_h > src_w]
+        if src_w > tgt_w or src_h > tgt_h:
+            vf_filters.append(_hls_scale_filter(tgt_w, tgt_h, cuda))
+    return vf_filters
+
+
 def convert_to_hls(
     input_path: str,
     output_dir: str,
@@ -197,66 +471,274 @@ def convert_to_hls(
     resolution: Optional[str] = None,
     auto_rotate: bool = False,
     *,
-    runner: FFmpegRunner = FFmpegRunner()
+    segment_format: str = "ts",
+    use_gpu: bool = False,
+    runner: Optional[FFmpegRunner] = None
 ):
     """
     Convert to HLS (playlist + segments), with optional auto-rotate
     and named-resolution downscaling. Raises HLSError on any failure.
+
+    `segment_format="fmp4"` writes CMAF/fMP4 segments (`.m4s` plus an
+    `{base_name}_init.mp4` init segment) instead of MPEG-TS.
+
+    With `use_gpu=True` and an ffmpeg build providing h264_nvenc, re-encodes
+    run entirely on the GPU (CUDA decode, npp filters, NVENC encode); if that
+    run fails it is retried once on the software path. Otherwise uses the
+    libx264 software path.
     """
     inp = Path(input_path)
+    runner = runner or default_runner()
     out_dir = Path(output_dir)
+    _check_segment_format(segment_format)
 
     try:
-        out_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(out_dir)
     except Exception as e:
         raise HLSError(f"Could not create output directory '{out_dir}': {e}") from e
 
     playlist = out_dir / f"{base_name}.m3u8"
-    orig_w, orig_h, raw = _probe_stream(inp, runner)
+    probe = _probe_stream(inp, runner)
+
+    for cuda in _hls_cuda_attempts(use_gpu, runner):
+        vf_filters = _hls_filters(probe, resolution, auto_rotate, cuda)
+
+        cmd = [*_FFMPEG_PREFIX]
+        if vf_filters and cuda:
+            # keep decoded frames in VRAM so the npp filters and NVENC never copy to host
+            cmd += ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        cmd += [
+            "-i", str(inp),
+            *_SANITIZE,
+        ]
+        cmd += [
+            *_hls_args_template(",".join(vf_filters), cuda, segment_time),
+            *_hls_segment_args(out_dir / f"{base_name}%d", f"{base_name}_init.mp4", segment_format),
+            "-f", "hls",
+            str(playlist),
+        ]
 
-    vf_filters: List[str] = []
-    if auto_rotate and raw in (-90, 90, 180, -180):
-        if raw == -90:
-            vf_filters.append("transpose=1")
-            src_w, src_h = orig_h, orig_w
-        elif raw == 90:
-            vf_filters.append("transpose=2")
+        try:
+            runner.run(cmd)
+            return
+        except FFmpegError as e:
+            if not (cuda and vf_filters):
+                raise HLSError(f"HLS conversion failed: {e}") from e
+
+
+def _has_audio(info: Dict[str, Any]) -> bool:
+    """True if a probe result lists an audio stream."""
+    return any(s.get("codec_type") == "audio" for s in info.get("streams", ()))
+
+
+def convert_to_hls_ladder(
+    input_path: str,
+    output_dir: str,
+    base_name: str,
+    ladder: Sequence[str] = ("480p", "720p", "1080p"),
+    segment_time: int = 10,
+    auto_rotate: bool = False,
+    *,
+    segment_format: str = "ts",
+    use_gpu: bool = False,
+    runner: Optional[FFmpegRunner] = None
+):
+    """
+    Convert to a multi-bitrate HLS ladder in a single ffmpeg invocation:
+    the input is decoded once and `split` into one scaled rendition per
+    `ladder` entry (names from RESOLUTION_MAP).
+
+    Writes `{base_name}.m3u8` (master playlist), `{base_name}_{res}.m3u8`
+    per rendition and `{base_name}_{res}_N.ts` segments (`.m4s` plus
+    `{base_name}_{res}_init.mp4` with `segment_format="fmp4"`). Renditions that
+    would upscale the source collapse into a single native-size rendition.
+    Raises ValueError for unknown resolutions and HLSError on any failure.
+    """
+    inp = Path(input_path)
+    runner = runner or default_runner()
+    out_dir = Path(output_dir)
+    _check_segment_format(segment_format)
+
+    keys = [r.casefold() for r in ladder]
+    unknown = [r for r in keys if r not in _VALID_RES]
+    if not keys or unknown:
+        raise ValueError(f"Invalid ladder {list(ladder)}. Valid: {list(RESOLUTION_MAP)}")
+
+    try:
+        _ensure_dir(out_dir)
+    except Exception as e:
+        raise HLSError(f"Could not create output directory '{out_dir}': {e}") from e
+
+    # one full probe: besides the video stream the ladder needs to know about audio
+    try:
+        info = runner.probe(inp)
+    except FFmpegError:
+        info = {}
+    orig_w, orig_h, raw = _video_stream_dims(info)
+    audio = _has_audio(info)
+    for cuda in _hls_cuda_attempts(use_gpu, runner):
+        rotate = _hls_rotate_filter(raw, cuda) if auto_rotate else None
+        if rotate and raw in (-90, 90):
             src_w, src_h = orig_h, orig_w
         else:
-            vf_filters.append("transpose=1,transpose=1")
-            src_w, src_h = orig_h, orig_w
-    else:
-        src_w, src_h = orig_w, orig_h
+            src_w, src_h = orig_w, orig_h
+
+        # (name, scale filter) per rendition, smallest first
+        variants: List[Tuple[str, str]] = []
+        native = False
+        for key in sorted(dict.fromkeys(keys), key=lambda k: RESOLUTION_MAP[k][1]):
+            tgt_w, tgt_h = _RES_SWAP[key, src_h > src_w]
+            if src_w > tgt_w or src_h > tgt_h:
+                variants.append((key, _hls_scale_filter(tgt_w, tgt_h, cuda)))
+            elif not native:
+                variants.append((key, "null"))
+                native = True
+
+        n = len(variants)
+        graph = f"[0:v]{rotate + ',' if rotate else ''}split={n}{''.join(f'[v{i}]' for i in range(n))}"
+        for i, (_, scale) in enumerate(variants):
+            graph += f";[v{i}]{scale}[v{i}o]"
+
+        cmd = [*_FFMPEG_PREFIX]
+        if cuda:
+            cmd += ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        cmd += [
+            "-i", str(inp),
+            *_SANITIZE,
+            "-filter_complex", graph,
+        ]
+        for i in range(n):
+            cmd += ["-map", f"[v{i}o]"]
+            if audio:
+                cmd += ["-map", "0:a:0"]
+        cmd += ["-metadata:s:v", "rotate=0", *_hls_encode_args(cuda)]
+        for i, (key, _) in enumerate(variants):
+            rate = _HLS_MAXRATE_KBPS[key]
+            cmd += [f"-maxrate:v:{i}", f"{rate}k", f"-bufsize:v:{i}", f"{rate * 2}k"]
+
+        stream_map = " ".join(
+            f"v:{i},a:{i},name:{key}" if audio else f"v:{i},name:{key}"
+            for i, (key, _) in enumerate(variants)
+        )
+        cmd += [
+            "-start_number", "0",
+            "-hls_time", str(segment_time),
+            "-hls_list_size", "0",
+            *_hls_segment_args(out_dir / f"{base_name}_%v_%d", f"{base_name}_%v_init.mp4", segment_format),
+            "-master_pl_name", f"{base_name}.m3u8",
+            "-var_stream_map", stream_map,
+            "-f", "hls",
+            str(out_dir / f"{base_name}_%v.m3u8"),
+        ]
 
-    if resolution:
-        key = resolution.lower()
-        if key not in RESOLUTION_MAP:
-            raise ValueError(f"Unknown resolution '{resolution}'. Valid: {list(RESOLUTION_MAP)}")
-        tgt_w, tgt_h = RESOLUTION_MAP[key]
-        if src_h > src_w:
-            tgt_w, tgt_h = tgt_h, tgt_w
-        if src_w > tgt_w or src_h > tgt_h:
-            vf_filters.append(
-                f"scale={tgt_w}:{tgt_h}:force_original_aspect_ratio=decrease,scale=trunc(iw/2)*2:trunc(ih/2)*2"
-            )
+        try:
+            runner.run(cmd)
+            return
+        except FFmpegError as e:
+            if not cuda:
+                raise HLSError(f"HLS ladder conversion failed: {e}") from e
+
+
+def create_all_derivatives(
+    input_path: str,
+    thumb_path: str,
+    gif_path: str,
+    hls_dir: str,
+    base_name: str,
+    *,
+    t: float = 1.0,
+    thumb_size: Optional[Tuple[int,int]] = None,
+    gif_start: float = 0,
+    gif_duration: float = 5,
+    gif_fps: int = 10,
+    gif_size: Optional[Tuple[int,int]] = None,
+    segment_time: int = 10,
+    resolution: Optional[str] = None,
+    auto_rotate: bool = False,
+    segment_format: str = "ts",
+    runner: Optional[FFmpegRunner] = None
+):
+    """
+    Write a JPEG thumbnail, a GIF preview and an HLS rendition of one video
+    in a single ffmpeg invocation: the input is probed and decoded once and
+    `split` into one filter branch per output (thumbnail and GIF branches
+    `trim` their time range). Output is equivalent to create_video_thumbnail
+    (exact=True), create_gif_preview and convert_to_hls with the same
+    arguments; the HLS stream is copied when it needs no filtering.
+
+    `t` and `gif_start` count from the start of the file, as `-ss` does:
+    ffmpeg shifts input timestamps to begin at 0 (a nonzero container
+    start_time is subtracted) before they reach `trim`.
+
+    Raises ValueError for an unknown resolution or segment format and
+    DerivativesError on any failure, including an output ffmpeg did not
+    write (e.g. `t` or `gif_start` past the end of the clip).
+    """
+    inp = Path(input_path)
+    runner = runner or default_runner()
+    thumb, gif, out_dir = Path(thumb_path), Path(gif_path), Path(hls_dir)
+    _check_segment_format(segment_format)
+
+    probe = _probe_stream(inp, runner)
+    hls_vf = _hls_filters(probe, resolution, auto_rotate, False)
+
+    for d in (thumb.parent, gif.parent, out_dir):
+        try:
+            _ensure_dir(d)
+        except Exception as e:
+            raise DerivativesError(f"Could not create output directory '{d}': {e}") from e
+
+    # ffmpeg leaves an existing file untouched when a trimmed branch is empty
+    for f in (thumb, gif):
+        try:
+            f.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise DerivativesError(f"Could not replace '{f}': {e}") from e
+
+    thumb_vf = _build_vf(probe.rotation, thumb_size, auto_rotate, f"trim=start={t}")
+    gif_vf = _build_vf(
+        probe.rotation, gif_size, auto_rotate,
+        f"trim=start={gif_start}:duration={gif_duration}", "setpts=PTS-STARTPTS", f"fps={gif_fps}",
+    )
+    graph = [
+        f"[0:v]split={3 if hls_vf else 2}[t][g]{'[h]' if hls_vf else ''}",
+        f"[t]{thumb_vf}[thumb]",
+        f"[g]{gif_vf},split[ga][gb]",
+        f"[ga]{_palettegen(gif_fps)}[p]",
+        "[gb][p]paletteuse[gif]",
+    ]
+    if hls_vf:
+        graph.append(f"[h]{','.join(hls_vf)}[hls]")
 
     cmd = [
-        "ffmpeg", "-y", "-noautorotate",
+        *_FFMPEG_PREFIX,
         "-i", str(inp),
-        "-map_metadata", "-1",
-        "-map_metadata:s:v:0", "-1",
+        "-filter_complex", ";".join(graph),
+        "-map", "[thumb]", *_SANITIZE,
+        "-frames:v", "1", "-c:v", "mjpeg", "-q:v", "2",
+        str(thumb),
+        "-map", "[gif]", *_SANITIZE,
+        "-loop", "0",
+        str(gif),
     ]
-    if vf_filters:
-        cmd += ["-vf", ",".join(vf_filters)]
-        cmd += ["-metadata:s:v:0", "rotate=0", "-c:v", "libx264", "-c:a", "aac", "-strict", "-2"]
+    if hls_vf:
+        cmd += [
+            "-map", "[hls]", "-map", "0:a:0?", *_SANITIZE,
+            "-metadata:s:v:0", "rotate=0", *_hls_encode_args(False),
+            "-start_number", "0",
+            "-hls_time", str(segment_time),
+            "-hls_list_size", "0",
+        ]
     else:
-        cmd += ["-c", "copy", "-metadata:s:v:0", "rotate=0"]
-
+        cmd += [
+            "-map", "0:v:0", "-map", "0:a:0?", *_SANITIZE,
+            *_hls_args_template("", False, segment_time),
+        ]
+    playlist = out_dir / f"{base_name}.m3u8"
     cmd += [
-        "-start_number", "0",
-        "-hls_time", str(segment_time),
-        "-hls_list_size", "0",
-        "-hls_segment_filename", str(out_dir / f"{base_name}%d.ts"),
+        *_hls_segment_args(out_dir / f"{base_name}%d", f"{base_name}_init.mp4", segment_format),
         "-f", "hls",
         str(playlist),
     ]
@@ -264,4 +746,11 @@ def convert_to_hls(
     try:
         runner.run(cmd)
     except FFmpegError as e:
-        raise HLSError(f"HLS conversion failed: {e}") from e
+        raise DerivativesError(f"Derivative generation failed: {e}") from e
+
+    missing = [str(p) for p in (thumb, gif, playlist) if not _has_output(p)]
+    if missing:
+        raise DerivativesError(
+            f"Derivative generation failed: no output at {', '.join(missing)} "
+            f"(t={t}s, gif_start={gif_start}s in '{inp}')"
+        )
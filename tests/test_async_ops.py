@@ -0,0 +1,62 @@
+# tests/test_async_ops.py
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from media_utils import async_ops
+from media_utils.async_ops import submit_image_thumbnail, submit_video_thumbnail
+from media_utils.images import ThumbnailError
+from media_utils.ffmpeg_runner import FFmpegRunner
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(async_ops, "_EXECUTOR", pool)
+    yield pool
+    pool.shutdown()
+
+def test_submit_image_thumbnail_in_process_pool(tmp_image, tmp_path):
+    out = tmp_path / "thumb.jpg"
+    try:
+        fut = submit_image_thumbnail(str(tmp_image), str(out), size=(40, 30))
+        assert fut.result(timeout=60) == str(out)
+    finally:
+        async_ops.shutdown()
+    assert Image.open(out).size == (40, 30)
+    assert async_ops._EXECUTOR is None
+
+def test_process_pool_uses_forkserver(monkeypatch):
+    import multiprocessing
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        pytest.skip("forkserver not available on this platform")
+    created = {}
+    class FakePool:
+        def __init__(self, max_workers, mp_context):
+            created["method"] = mp_context.get_start_method()
+    monkeypatch.setattr(async_ops, "ProcessPoolExecutor", FakePool)
+    monkeypatch.setattr(async_ops, "_EXECUTOR", None)
+    async_ops._get_executor()
+    assert created["method"] == "forkserver"
+
+def test_submit_image_thumbnail_error(thread_pool, tmp_path):
+    fut = submit_image_thumbnail(str(tmp_path / "missing.jpg"), str(tmp_path / "t.jpg"))
+    with pytest.raises(ThumbnailError):
+        fut.result(timeout=10)
+
+def test_submit_video_thumbnail(thread_pool, tmp_path):
+    class RecordingRunner(FFmpegRunner):
+        __slots__ = ("commands",)
+        def __init__(self):
+            self.commands = []
+        def probe(self, path, **options):
+            return {"streams": []}
+        def run(self, cmd):
+            self.commands.append(cmd)
+            Path(cmd[-1]).write_bytes(b"\xff")
+
+    runner = RecordingRunner()
+    out = tmp_path / "thumb.jpg"
+    fut = submit_video_thumbnail(str(tmp_path / "in.mp4"), str(out), t=2.0, runner=runner)
+    assert fut.result(timeout=10) == str(out)
+    assert runner.commands[0][-1] == str(out)
@@ -0,0 +1,36 @@
+# tests/test_batch.py
+
+import threading
+import pytest
+from media_utils.batch import run_tasks, HLS_WORKERS, THUMBNAIL_WORKERS
+
+def test_run_tasks_preserves_order():
+    def add(a, b, scale=1):
+        return (a + b) * scale
+    tasks = [(add, (i, 1), {"scale": 2}) for i in range(10)]
+    assert run_tasks(tasks, max_workers=4) == [(i + 1) * 2 for i in range(10)]
+
+def test_run_tasks_empty():
+    assert run_tasks([]) == []
+
+def test_run_tasks_runs_concurrently():
+    # every task waits for the others; only completes if they overlap
+    barrier = threading.Barrier(3, timeout=5)
+    tasks = [(barrier.wait, (), {}) for _ in range(3)]
+    assert sorted(run_tasks(tasks, max_workers=3)) == [0, 1, 2]
+
+def test_run_tasks_propagates_first_error():
+    done = []
+    def ok(i):
+        done.append(i)
+        return i
+    def boom():
+        raise ValueError("task failed")
+    with pytest.raises(ValueError, match="task failed"):
+        run_tasks([(ok, (1,), {}), (boom, (), {}), (ok, (2,), {})], max_workers=1)
+    # remaining tasks still ran before the error surfaced
+    assert sorted(done) == [1, 2]
+
+def test_worker_defaults():
+    assert THUMBNAIL_WORKERS >= 2
+    assert HLS_WORKERS >= 1
@@ -42,12 +42,13 @@ def test_probe_failure(monkeypatch):
 
 def test_run_success(monkeypatch):
     # Arrange: fake subprocess.run to record args
+    from media_utils import ffmpeg_runner
+    monkeypatch.setattr("media_utils.ffmpeg_runner.shutil.which", lambda name: f"/usr/bin/{name}")
+    ffmpeg_runner._which.cache_clear()
     called = {}
-    def fake_run(cmd, check, stdout, stderr):
+    def fake_run(cmd, **kwargs):
         called['cmd'] = cmd
-        called['check'] = check
-        called['stdout'] = stdout
-        called['stderr'] = stderr
+        called.update(kwargs)
         # no exception → success
     monkeypatch.setattr(
         "media_utils.ffmpeg_runner.subprocess.run",
@@ -60,16 +61,22 @@ def test_run_success(monkeypatch):
     ret = runner.run(cmd)
     # Assert
     assert ret is None
-    assert called['cmd'] == cmd
+    # executable resolved to an absolute path so posix_spawn can be used
+    assert called['cmd'] == ["/usr/bin/ffmpeg", "-version"]
     assert called['check'] is True
-    # stdout/stderr should be redirected to DEVNULL
+    assert called['close_fds'] is False
+    # stdin/stdout to DEVNULL, stderr captured for error messages
+    assert called['stdin'] == subprocess.DEVNULL
     assert called['stdout'] == subprocess.DEVNULL
-    assert called['stderr'] == subprocess.DEVNULL
+    assert called['stderr'] == subprocess.PIPE
+    ffmpeg_runner._which.cache_clear()
 
 def test_run_failure(monkeypatch):
     # Arrange: fake subprocess.run to throw CalledProcessError
-    def fake_run(cmd, check, stdout, stderr):
-        raise subprocess.CalledProcessError(1, cmd, output=b"", stderr=b"err")
+    def fake_run(cmd, **kwargs):
+        raise subprocess.CalledProcessError(
+            1, cmd, output=b"", stderr=b"ffmpeg version 6\nUnrecognized option 'badflag'.\n"
+        )
     monkeypatch.setattr(
         "media_utils.ffmpeg_runner.subprocess.run",
         fake_run
@@ -82,3 +89,169 @@ def test_run_failure(monkeypatch):
 
     msg = str(exc.value)
     assert "ffmpeg cmd failed: ffmpeg -badflag" in msg
+    assert "Unrecognized option 'badflag'." in msg
+
+def test_run_failure_without_stderr(monkeypatch):
+    def fake_run(cmd, **kwargs):
+        raise subprocess.CalledProcessError(1, cmd, output=b"", stderr=b"")
+    monkeypatch.setattr("media_utils.ffmpeg_runner.subprocess.run", fake_run)
+
+    with pytest.raises(FFmpegError) as exc:
+        FFmpegRunner().run(["ffmpeg", "-badflag"])
+    assert str(exc.value) == "ffmpeg cmd failed: ffmpeg -badflag"
+
+def test_has_encoder_parses_listing(monkeypatch):
+    from media_utils import ffmpeg_runner
+    listing = (
+        "Encoders:\n"
+        " V..... = Video\n"
+        " ------\n"
+        " V....D libx264              libx264 H.264 / AVC\n"
+        " V....D h264_nvenc           NVIDIA NVENC H.264 encoder\n"
+        " A....D aac                  AAC (Advanced Audio Coding)\n"
+    )
+    calls = []
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=listing, stderr="")
+    monkeypatch.setattr("media_utils.ffmpeg_runner.subprocess.run", fake_run)
+    ffmpeg_runner._list_encoders.cache_clear()
+
+    runner = FFmpegRunner()
+    assert runner.has_encoder("h264_nvenc") is True
+    assert runner.has_encoder("libx264") is True
+    assert runner.has_encoder("hevc_nvenc") is False
+    # listing is probed once and cached
+    assert len(calls) == 1
+    ffmpeg_runner._list_encoders.cache_clear()
+
+def test_has_encoder_missing_ffmpeg(monkeypatch):
+    from media_utils import ffmpeg_runner
+    def fake_run(cmd, **kwargs):
+        raise FileNotFoundError("ffmpeg")
+    monkeypatch.setattr("media_utils.ffmpeg_runner.subprocess.run", fake_run)
+    ffmpeg_runner._list_encoders.cache_clear()
+
+    assert FFmpegRunner().has_encoder("h264_nvenc") is False
+    ffmpeg_runner._list_encoders.cache_clear()
+
+def test_probe_cached_per_file_version(monkeypatch, tmp_path):
+    from media_utils import ffmpeg_runner
+    ffmpeg_runner._cached_probe.cache_clear()
+    calls = []
+    def fake_probe(path_str):
+        calls.append(path_str)
+        return {"streams": [], "n": len(calls)}
+    monkeypatch.setattr("media_utils.ffmpeg_runner.ffmpeg.probe", fake_probe)
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"a")
+    runner = FFmpegRunner()
+
+    first = runner.probe(video)
+    assert runner.probe(video) is first
+    assert len(calls) == 1
+
+    # a modified file is probed again
+    video.write_bytes(b"abc")
+    assert runner.probe(video)["n"] == 2
+    assert len(calls) == 2
+    ffmpeg_runner._cached_probe.cache_clear()
+
+def test_probe_errors_are_not_cached(monkeypatch, tmp_path):
+    from media_utils import ffmpeg_runner
+    ffmpeg_runner._cached_probe.cache_clear()
+    results = [RuntimeError("transient"), {"streams": []}]
+    def fake_probe(path_str):
+        r = results.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+    monkeypatch.setattr("media_utils.ffmpeg_runner.ffmpeg.probe", fake_probe)
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"a")
+    runner = FFmpegRunner()
+    with pytest.raises(FFmpegError):
+        runner.probe(video)
+    assert runner.probe(video) == {"streams": []}
+    ffmpeg_runner._cached_probe.cache_clear()
+
+def test_probe_coalesces_concurrent_requests(monkeypatch, tmp_path):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from media_utils import ffmpeg_runner
+
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    def slow_probe(path, mtime_ns, size, options):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        return {"streams": []}
+    # bypass the LRU so only in-flight sharing can prevent a second probe
+    monkeypatch.setattr(ffmpeg_runner, "_cached_probe", slow_probe)
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"a")
+    runner = FFmpegRunner()
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        first = ex.submit(runner.probe, video)
+        started.wait(5)
+        others = [ex.submit(runner.probe, video) for _ in range(3)]
+        time.sleep(0.2)  # let the waiters block on the in-flight probe
+        release.set()
+        results = [first.result()] + [f.result() for f in others]
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert ffmpeg_runner._INFLIGHT == {}
+
+def test_probe_coalesced_error_propagates(monkeypatch, tmp_path):
+    from media_utils import ffmpeg_runner
+    ffmpeg_runner._cached_probe.cache_clear()
+    def bad_probe(path_str):
+        raise RuntimeError("ffprobe crashed")
+    monkeypatch.setattr("media_utils.ffmpeg_runner.ffmpeg.probe", bad_probe)
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"a")
+    with pytest.raises(FFmpegError, match="ffprobe crashed"):
+        FFmpegRunner().probe(video)
+    assert ffmpeg_runner._INFLIGHT == {}
+
+def test_default_runner_is_singleton():
+    from media_utils.ffmpeg_runner import default_runner
+    assert isinstance(default_runner(), FFmpegRunner)
+    assert default_runner() is default_runner()
+
+def test_probe_passes_options_and_caches_per_options(monkeypatch, tmp_path):
+    from media_utils import ffmpeg_runner
+    ffmpeg_runner._cached_probe.cache_clear()
+    calls = []
+    def fake_probe(path_str, **kwargs):
+        calls.append(kwargs)
+        return {"streams": []}
+    monkeypatch.setattr("media_utils.ffmpeg_runner.ffmpeg.probe", fake_probe)
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"a")
+    runner = FFmpegRunner()
+    runner.probe_video_stream(video)
+    runner.probe_video_stream(video)
+    runner.probe(video)
+    assert calls == [{"select_streams": "v:0"}, {}]
+    ffmpeg_runner._cached_probe.cache_clear()
+
+def test_runner_has_no_instance_dict():
+    with pytest.raises(AttributeError):
+        FFmpegRunner().cache = {}
+
+def test_accepts_probe_options():
+    from media_utils.ffmpeg_runner import _accepts_probe_options
+    assert _accepts_probe_options(FFmpegRunner.probe)
+    assert _accepts_probe_options(lambda self, path, select_streams=None: None)
+    assert not _accepts_probe_options(lambda self, path: None)
+    assert not _accepts_probe_options(42)
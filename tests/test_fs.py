@@ -0,0 +1,46 @@
+# tests/test_fs.py
+
+import pytest
+from pathlib import Path
+from media_utils import _fs
+from media_utils._fs import _ensure_dir
+
+def test_ensure_dir_creates_nested(tmp_path):
+    target = tmp_path / "a" / "b" / "c"
+    _ensure_dir(target)
+    assert target.is_dir()
+
+def test_ensure_dir_skips_mkdir_when_cached(tmp_path, monkeypatch):
+    target = tmp_path / "out"
+    _ensure_dir(target)
+
+    calls = []
+    monkeypatch.setattr(Path, "mkdir", lambda self, *a, **k: calls.append(self))
+    _ensure_dir(target)
+    _ensure_dir(tmp_path / "other")
+    assert calls == [tmp_path / "other"]
+
+def test_ensure_dir_failure_is_not_cached(tmp_path, monkeypatch):
+    target = tmp_path / "denied"
+    def bad_mkdir(self, *args, **kwargs):
+        raise PermissionError("no")
+    monkeypatch.setattr(Path, "mkdir", bad_mkdir)
+    with pytest.raises(PermissionError):
+        _ensure_dir(target)
+    assert str(target) not in _fs._MKDIR_CACHE
+
+def test_ensure_dir_recreates_removed_directory(tmp_path):
+    import shutil
+    target = tmp_path / "jobs" / "42"
+    _ensure_dir(target)
+    shutil.rmtree(tmp_path / "jobs")
+    _ensure_dir(target)
+    assert target.is_dir()
+
+def test_ensure_dir_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(_fs, "_MKDIR_CACHE", set())
+    monkeypatch.setattr(_fs, "_MKDIR_CACHE_MAX", 3)
+    for i in range(5):
+        _ensure_dir(tmp_path / str(i))
+    assert len(_fs._MKDIR_CACHE) <= 3
+    assert str(tmp_path / "4") in _fs._MKDIR_CACHE
@@ -16,6 +16,34 @@ def test_create_thumbnail_success(tmp_image, tmp_path):
     thumb = Image.open(out)
     assert thumb.size == (50, 60)
 
+def test_create_thumbnail_to_bytes(tmp_image, tmp_path):
+    import io
+    data = create_image_thumbnail(str(tmp_image), size=(40, 30))
+    assert data[:2] == b"\xff\xd8"
+    thumb = Image.open(io.BytesIO(data))
+    assert thumb.format == "JPEG"
+    assert thumb.size == (40, 30)
+    assert thumb.info.get("progressive") == 1
+    # nothing written next to the source
+    assert list(tmp_path.iterdir()) == [tmp_image]
+
+def test_create_thumbnail_to_bytes_converts_alpha(tmp_path):
+    import io
+    src = tmp_path / "alpha.png"
+    Image.new("RGBA", (60, 60), (255, 0, 0, 128)).save(src)
+    data = create_image_thumbnail(str(src), None, (20, 20))
+    assert Image.open(io.BytesIO(data)).mode == "RGB"
+
+def test_create_thumbnail_to_bytes_encode_error(tmp_image):
+    class DummyThumb:
+        mode = "RGB"
+        def save(self, fp, **options):
+            raise ValueError("encoder missing")
+    with pytest.raises(ThumbnailError) as exc:
+        create_image_thumbnail(str(tmp_image), size=(20, 20),
+                               fit_image=lambda img, size, method, centering: DummyThumb())
+    assert "Could not encode thumbnail" in str(exc.value)
+
 def test_create_thumbnail_missing_input(tmp_path):
     inp = tmp_path / "missing.jpg"
     out = tmp_path / "thumb.jpg"
@@ -40,7 +68,7 @@ def test_create_thumbnail_resize_error(tmp_image, tmp_path):
 def test_create_thumbnail_save_error(tmp_image, tmp_path):
     # simulate save failure
     class DummyThumb:
-        def save(self, path):
+        def save(self, path, **options):
             raise IOError("disk full")
     def fake_fit(img, size, filter, centering):
         return DummyThumb()
@@ -73,7 +101,7 @@ def test_get_orientation_bad_image(tmp_path):
 
 def test_get_orientation_read_exif_error(monkeypatch):
     class FakeImg:
-        def _getexif(self):
+        def getexif(self):
             raise RuntimeError("parse error")
         def close(self): pass
 
@@ -143,11 +171,11 @@ def test_get_orientation_unexpected_open_error():
     assert "Unexpected error opening image 'dummy.jpg': oops" in msg
 
 def test_get_orientation_close_raises_and_is_suppressed():
-    # Prepare a dummy image whose _getexif returns empty, but close() raises
+    # Prepare a dummy image whose getexif returns empty, but close() raises
     class DummyImg:
         def __init__(self):
             pass
-        def _getexif(self):
+        def getexif(self):
             return {}  # no EXIF data
         def close(self):
             raise RuntimeError("close failed")
@@ -160,24 +188,24 @@ def test_get_orientation_close_raises_and_is_suppressed():
     result = get_image_orientation("ignored.jpg", open_image=fake_open)
     assert result == 0
 
-def test_get_orientation_tag_iteration_exception(monkeypatch):
-    # 1) Stub a dummy image with non-empty EXIF
+def test_get_orientation_does_not_scan_exif_tag_names(monkeypatch):
+    # 1) Stub a dummy image with the Orientation tag (0x0112) set to 6
     class DummyImg:
-        def _getexif(self):
-            return {274: 6}  # orientation tag present but we won't get that far
+        def getexif(self):
+            return {274: 6}
         def close(self):
             pass
 
     def fake_open(path):
         return DummyImg()
 
-    # 2) Monkey‐patch ExifTags.TAGS to None so `.items()` raises
-    import media_utils.images as imgs
-    monkeypatch.setattr(imgs.ExifTags, 'TAGS', None)
+    # 2) Break ExifTags.TAGS; the lookup uses the constant tag id instead
+    from PIL import ExifTags
+    monkeypatch.setattr(ExifTags, 'TAGS', None)
 
-    # 3) Call and assert we get 0 (fallback on exception)
-    deg = imgs.get_image_orientation("ignored.jpg", open_image=fake_open)
-    assert deg == 0
+    # 3) Orientation 6 → 90° regardless of the tag-name table
+    deg = get_image_orientation("ignored.jpg", open_image=fake_open)
+    assert deg == 90
 
 def test_get_orientation_fetch_error(monkeypatch):
     # Dummy EXIF dict that is non-empty but raises on .get()
@@ -187,9 +215,9 @@ def test_get_orientation_fetch_error(monkeypatch):
         def get(self, key, default=None):
             raise RuntimeError("fetch error")
 
-    # Dummy image whose _getexif returns our BadExif
+    # Dummy image whose getexif returns our BadExif
     class DummyImg:
-        def _getexif(self):
+        def getexif(self):
             return BadExif()
         def close(self):
             pass
@@ -204,3 +232,389 @@ def test_get_orientation_fetch_error(monkeypatch):
 
     assert "Error fetching Orientation tag value: fetch error" in str(exc.value)
 
+
+def test_create_thumbnail_large_jpeg_uses_draft(tmp_path):
+    src = tmp_path / "large.jpg"
+    Image.new("RGB", (1600, 1200), color="red").save(src)
+    drafted = {}
+
+    def tracking_open(path):
+        img = Image.open(path)
+        orig = img.draft
+        def draft(mode, size):
+            drafted["request"] = (mode, size)
+            return orig(mode, size)
+        img.draft = draft
+        return img
+
+    out = tmp_path / "thumb.jpg"
+    create_image_thumbnail(str(src), str(out), size=(100, 50), open_image=tracking_open)
+    # drafted at twice the target so LANCZOS still has detail to work with
+    assert drafted["request"] == ("RGB", (200, 100))
+    assert Image.open(out).size == (100, 50)
+
+def test_fit_image_matches_imageops_fit_geometry():
+    from PIL import ImageOps
+    from media_utils.images import _fit_image
+    # left half black, right half white; a 1:1 crop keeps the centre columns
+    img = Image.new("L", (400, 100), 0)
+    img.paste(255, (200, 0, 400, 100))
+
+    ours = _fit_image(img, (50, 50), Image.LANCZOS, centering=(0.5, 0.5))
+    ref = ImageOps.fit(img, (50, 50), Image.LANCZOS, centering=(0.5, 0.5))
+    assert ours.size == ref.size == (50, 50)
+    assert ours.getpixel((5, 25)) == ref.getpixel((5, 25)) == 0
+    assert ours.getpixel((45, 25)) == ref.getpixel((45, 25)) == 255
+
+def test_fit_image_integer_ratio_uses_reduce():
+    from media_utils.images import _fit_image
+    img = Image.effect_noise((1600, 1000), 64).convert("RGB")
+
+    # 1:1 crop of the centre 1000x1000, shrunk exactly 4x
+    thumb = _fit_image(img, (250, 250))
+    expected = img.reduce(4, box=(300, 0, 1300, 1000))
+    assert thumb.size == (250, 250)
+    assert thumb.tobytes() == expected.tobytes()
+
+def test_fit_image_non_integer_ratio_uses_resize():
+    from media_utils.images import _fit_image
+    img = Image.effect_noise((1000, 1000), 64).convert("RGB")
+    thumb = _fit_image(img, (300, 300))
+    assert thumb.size == (300, 300)
+    assert thumb.tobytes() == img.resize((300, 300), Image.LANCZOS, reducing_gap=2.0).tobytes()
+
+def test_get_orientation_cached_until_file_changes(exif_image_factory, monkeypatch):
+    import os
+    import media_utils.images as imgs
+    imgs._orientation_cached.cache_clear()
+    path = exif_image_factory(6)
+
+    opened = []
+    real_read = imgs._fast_read_orientation
+    monkeypatch.setattr(imgs, "_fast_read_orientation", lambda p: opened.append(p) or real_read(p))
+
+    assert get_image_orientation(str(path)) == 90
+    assert get_image_orientation(str(path)) == 90
+    assert len(opened) == 1
+
+    # rewriting the file (new size/mtime) invalidates the entry
+    img = Image.new("RGB", (20, 20))
+    exif = img.getexif()
+    exif[0x0112] = 3
+    img.save(path, exif=exif.tobytes())
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert get_image_orientation(str(path)) == 180
+    assert len(opened) == 2
+    imgs._orientation_cached.cache_clear()
+
+def test_get_orientation_injected_open_is_not_cached():
+    calls = []
+    class DummyImg:
+        def getexif(self):
+            return {0x0112: 8}
+        def close(self):
+            pass
+    def fake_open(path):
+        calls.append(path)
+        return DummyImg()
+
+    assert get_image_orientation("same.jpg", open_image=fake_open) == 270
+    assert get_image_orientation("same.jpg", open_image=fake_open) == 270
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("exif,expected", [
+    ({}, 0),
+    (None, 0),
+    ({0x0112: 3}, 180),
+    ({0x0112: 5}, 270),
+    ({0x0112: 0}, 0),
+])
+def test_get_orientation_table_lookup(exif, expected):
+    class DummyImg:
+        def getexif(self):
+            return exif
+        def close(self):
+            pass
+    assert get_image_orientation("x.jpg", open_image=lambda p: DummyImg()) == expected
+
+@pytest.mark.parametrize("code", range(1, 9))
+def test_fast_read_orientation_matches_pillow(code, exif_image_factory):
+    from media_utils.images import _fast_read_orientation
+    path = exif_image_factory(code)
+    with Image.open(path) as img:
+        assert _fast_read_orientation(str(path)) == img.getexif()[0x0112] == code
+
+def test_fast_read_orientation_big_endian(tmp_path):
+    from media_utils.images import _fast_read_orientation
+    tiff = (b"MM\x00\x2a\x00\x00\x00\x08"          # header, IFD0 at 8
+            b"\x00\x01"                              # one entry
+            b"\x01\x12\x00\x03\x00\x00\x00\x01\x00\x06\x00\x00"
+            b"\x00\x00\x00\x00")                     # no next IFD
+    app1 = b"Exif\x00\x00" + tiff
+    path = tmp_path / "mm.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe1" + (len(app1) + 2).to_bytes(2, "big") + app1
+                     + b"\xff\xda\x00\x02\xff\xd9")
+    assert _fast_read_orientation(str(path)) == 6
+
+def _exif_app1(tiff):
+    return (0xE1, b"Exif\x00\x00" + tiff)
+
+# IFD0 with a single Orientation=6 entry; the type field is patched per test
+_TIFF_ORIENTATION_6 = (b"II*\x00\x08\x00\x00\x00\x01\x00"
+                       b"\x12\x01\x03\x00\x01\x00\x00\x00\x06\x00\x00\x00"
+                       b"\x00\x00\x00\x00")
+
+def test_fast_read_orientation_skips_fill_bytes_and_rst_markers(tmp_path):
+    from media_utils.images import _fast_read_orientation
+    app1 = b"Exif\x00\x00" + _TIFF_ORIENTATION_6
+    path = tmp_path / "fill.jpg"
+    path.write_bytes(b"\xff\xd8" + b"\xff\xd0" + b"\xff\x01"
+                     + b"\xff\xff\xff\xe1" + (len(app1) + 2).to_bytes(2, "big") + app1
+                     + b"\xff\xda\x00\x02\xff\xd9")
+    assert _fast_read_orientation(str(path)) == 6
+
+@pytest.mark.parametrize("tiff", [
+    _TIFF_ORIENTATION_6.replace(b"\x12\x01\x03\x00", b"\x12\x01\x04\x00"),   # LONG, not SHORT
+    b"XX" + _TIFF_ORIENTATION_6[2:],                                            # unknown byte order
+    _TIFF_ORIENTATION_6[:2] + b"\x2b" + _TIFF_ORIENTATION_6[3:],                # bad TIFF magic
+])
+def test_fast_read_orientation_malformed_exif_falls_back(tiff, tmp_path):
+    from media_utils.images import _fast_read_orientation
+    path = _jpeg_with_segments(tmp_path / "bad.jpg", _exif_app1(tiff))
+    assert _fast_read_orientation(str(path)) is None
+
+def test_fast_read_orientation_unreadable(tmp_path):
+    from media_utils.images import _fast_read_orientation
+    assert _fast_read_orientation(str(tmp_path)) is None
+
+@pytest.mark.parametrize("error, message", [
+    (FileNotFoundError("gone"), "Input file not found"),
+    (UnidentifiedImageError("nope"), "Cannot identify image file"),
+])
+def test_get_orientation_injected_open_errors(error, message):
+    def bad_open(path):
+        raise error
+    with pytest.raises(OrientationError, match=message):
+        get_image_orientation("x.jpg", open_image=bad_open)
+
+def test_get_orientation_stat_error(monkeypatch):
+    import media_utils.images as imgs
+    def bad_stat(path):
+        raise PermissionError("denied")
+    monkeypatch.setattr(imgs.os, "stat", bad_stat)
+    with pytest.raises(OrientationError, match="I/O error opening image"):
+        get_image_orientation("locked.jpg")
+
+def test_fast_read_orientation_without_exif(tmp_image):
+    from media_utils.images import _fast_read_orientation
+    assert _fast_read_orientation(str(tmp_image)) == 1
+
+@pytest.mark.parametrize("data", [
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff\xe1\x40\x00Exif",          # segment runs past the data
+    b"\xff\xd8garbage",
+    b"\xff\xd8",                              # truncated before any marker
+    b"\xff\xd8\xff\xe1\x00",                  # truncated segment length
+])
+def test_fast_read_orientation_falls_back(data, tmp_path):
+    from media_utils.images import _fast_read_orientation
+    path = tmp_path / "x.bin"
+    path.write_bytes(data)
+    assert _fast_read_orientation(str(path)) is None
+
+def test_get_orientation_jpeg_skips_pillow(exif_image_factory, monkeypatch):
+    import media_utils.images as imgs
+    imgs._orientation_cached.cache_clear()
+    path = exif_image_factory(8)
+    monkeypatch.setattr(imgs.Image, "open", lambda p: pytest.fail("Pillow opened the file"))
+    assert get_image_orientation(str(path)) == 270
+    imgs._orientation_cached.cache_clear()
+
+class FakeVips:
+    """Minimal stand-in for the pyvips module."""
+    class Error(Exception):
+        pass
+
+    def __init__(self, fail_open=False, fail_save=False, alpha=False):
+        self.calls = []
+        self.fail_open = fail_open
+        self.fail_save = fail_save
+        self.alpha = alpha
+        vips = self
+
+        class VipsImage:
+            @staticmethod
+            def thumbnail(path, width, **kwargs):
+                vips.calls.append(("thumbnail", path, width, kwargs))
+                if vips.fail_open:
+                    raise FakeVips.Error("unable to load")
+                return VipsImage()
+
+            def hasalpha(self):
+                return vips.alpha
+
+            def flatten(self):
+                vips.calls.append(("flatten",))
+                return self
+
+            def _save(self, *call):
+                vips.calls.append(call)
+                if vips.fail_save:
+                    raise FakeVips.Error("write failed")
+
+            def jpegsave(self, path, **kwargs):
+                self._save("jpegsave", path, kwargs)
+
+            def write_to_file(self, path):
+                self._save("write_to_file", path)
+
+            def jpegsave_buffer(self, **kwargs):
+                self._save("jpegsave_buffer", kwargs)
+                return b"\xff\xd8vips"
+
+        self.Image = VipsImage
+
+def test_create_thumbnail_vips_backend(tmp_image, tmp_path, monkeypatch):
+    import media_utils.images as imgs
+    vips = FakeVips()
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", vips)
+
+    out = tmp_path / "thumb.jpg"
+    assert create_image_thumbnail(str(tmp_image), str(out), size=(60, 40)) is None
+    assert vips.calls[0] == ("thumbnail", str(tmp_image), 60,
+                             {"height": 40, "crop": "centre", "no_rotate": True})
+    assert vips.calls[1] == ("jpegsave", str(out), imgs._VIPS_JPEG_OPTIONS)
+
+    assert create_image_thumbnail(str(tmp_image), size=(60, 40)) == b"\xff\xd8vips"
+
+def test_create_thumbnail_vips_open_error(tmp_path, monkeypatch):
+    import media_utils.images as imgs
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", FakeVips(fail_open=True))
+    with pytest.raises(ThumbnailError, match="Cannot open image"):
+        create_image_thumbnail(str(tmp_path / "missing.jpg"), str(tmp_path / "t.jpg"))
+
+def test_create_thumbnail_vips_to_bytes_flattens_alpha(tmp_image, monkeypatch):
+    import media_utils.images as imgs
+    vips = FakeVips(alpha=True)
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", vips)
+
+    assert create_image_thumbnail(str(tmp_image), size=(60, 40)) == b"\xff\xd8vips"
+    assert [c[0] for c in vips.calls] == ["thumbnail", "flatten", "jpegsave_buffer"]
+
+def test_create_thumbnail_vips_non_jpeg_output(tmp_image, tmp_path, monkeypatch):
+    import media_utils.images as imgs
+    vips = FakeVips()
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", vips)
+
+    out = tmp_path / "thumb.png"
+    create_image_thumbnail(str(tmp_image), str(out), size=(60, 40))
+    assert vips.calls[1] == ("write_to_file", str(out))
+
+@pytest.mark.parametrize("output, message", [
+    (None, "Could not encode thumbnail"),
+    ("thumb.jpg", "Could not save thumbnail to"),
+    ("thumb.png", "Could not save thumbnail to"),
+])
+def test_create_thumbnail_vips_save_error(output, message, tmp_image, tmp_path, monkeypatch):
+    import media_utils.images as imgs
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", FakeVips(fail_save=True))
+    out = str(tmp_path / output) if output else None
+    with pytest.raises(ThumbnailError, match=message):
+        create_image_thumbnail(str(tmp_image), out, size=(60, 40))
+
+def test_create_thumbnail_vips_backend_keeps_injected_functions(tmp_image, tmp_path, monkeypatch):
+    import media_utils.images as imgs
+    vips = FakeVips()
+    monkeypatch.setattr(imgs, "_BACKEND", "vips")
+    monkeypatch.setattr(imgs, "pyvips", vips)
+
+    out = tmp_path / "thumb.jpg"
+    create_image_thumbnail(str(tmp_image), str(out), size=(20, 20),
+                           fit_image=lambda img, size, *a, **k: img.resize(size))
+    assert vips.calls == []
+    assert Image.open(out).size == (20, 20)
+
+_XMP_ORIENTATION_6 = (
+    b"http://ns.adobe.com/xap/1.0/\x00"
+    b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF '
+    b'xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"><rdf:Description '
+    b'xmlns:tiff="http://ns.adobe.com/tiff/1.0/" tiff:Orientation="6"/></rdf:RDF></x:xmpmeta>'
+)
+# IFD0 with a single ImageDescription entry and no Orientation
+_EXIF_WITHOUT_ORIENTATION = (
+    b"Exif\x00\x00II*\x00\x08\x00\x00\x00\x01\x00"
+    b"\x0e\x01\x02\x00\x02\x00\x00\x00a\x00\x00\x00\x00\x00\x00\x00"
+)
+
+def _jpeg_with_segments(path, *segments):
+    """Write a small JPEG with the given (marker byte, payload) segments after SOI."""
+    import io
+    buf = io.BytesIO()
+    Image.new("RGB", (20, 10), "red").save(buf, "JPEG")
+    jpg = buf.getvalue()
+    extra = b"".join(b"\xff" + bytes([m]) + (len(d) + 2).to_bytes(2, "big") + d for m, d in segments)
+    path.write_bytes(jpg[:2] + extra + jpg[2:])
+    return path
+
+@pytest.mark.parametrize("segments", [
+    [(0xE1, _XMP_ORIENTATION_6)],
+    [(0xE1, _EXIF_WITHOUT_ORIENTATION), (0xE1, _XMP_ORIENTATION_6)],
+])
+def test_get_orientation_xmp_matches_pillow(segments, tmp_path):
+    import media_utils.images as imgs
+    from media_utils.images import _fast_read_orientation
+    imgs._orientation_cached.cache_clear()
+    path = _jpeg_with_segments(tmp_path / "xmp.jpg", *segments)
+
+    assert _fast_read_orientation(str(path)) is None
+    assert get_image_orientation(str(path)) == 90
+    assert get_image_orientation(str(path), open_image=Image.open) == 90
+    imgs._orientation_cached.cache_clear()
+
+def test_create_thumbnail_after_output_dir_removed(tmp_image, tmp_path):
+    import shutil
+    out = tmp_path / "job" / "thumb.jpg"
+    create_image_thumbnail(str(tmp_image), str(out), size=(20, 20))
+    shutil.rmtree(out.parent)
+    create_image_thumbnail(str(tmp_image), str(out), size=(20, 20))
+    assert out.exists()
+
+def test_create_thumbnail_16bit_png(tmp_path):
+    src = tmp_path / "deep.png"
+    Image.new("I;16", (400, 300), 40000).save(src)
+    out = tmp_path / "thumb.png"
+    create_image_thumbnail(str(src), str(out), size=(40, 30))
+    assert Image.open(out).size == (40, 30)
+
+@pytest.mark.parametrize("name, expected", [
+    ("thumb.jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    ("thumb.JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    ("thumb.png", {}),
+    ("thumb.gif", {}),
+])
+def test_create_thumbnail_jpeg_options_only_for_jpeg(name, expected, tmp_image, tmp_path, monkeypatch):
+    saved = {}
+    real_save = Image.Image.save
+    def recording_save(self, fp, format=None, **params):
+        saved.update(params)
+        return real_save(self, fp, format, **params)
+    monkeypatch.setattr(Image.Image, "save", recording_save)
+
+    create_image_thumbnail(str(tmp_image), str(tmp_path / name), size=(20, 20))
+    assert saved == expected
+
+@pytest.mark.parametrize("backend, loaded", [("pil", False), ("vips", True)])
+def test_pyvips_imported_only_for_vips_backend(backend, loaded):
+    import os, subprocess, sys
+    code = ("import sys; sys.modules['pyvips'] = type(sys)('pyvips'); "
+            "import media_utils.images as imgs; print(imgs.pyvips is not None)")
+    env = {**os.environ, "MEDIA_THUMB_BACKEND": backend}
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         env=env, check=True, cwd=str(Path(__file__).parent.parent))
+    assert out.stdout.strip() == str(loaded)
@@ -0,0 +1,178 @@
+# tests/test_nvcodec_runner.py
+
+from PIL import Image
+from media_utils import nvcodec_runner
+from media_utils.nvcodec_runner import NvCodecRunner, parse_frame_grab, apply_filters
+from media_utils.ffmpeg_runner import FFmpegRunner
+
+THUMB_CMD = [
+    "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-noautorotate",
+    "-ss", "2.5", "-noaccurate_seek", "-skip_frame", "nokey",
+    "-i", "in.mp4",
+    "-map_metadata", "-1", "-map_metadata:s:v:0", "-1",
+    "-vf", "scale=32:16:force_original_aspect_ratio=increase,crop=32:16,transpose=1",
+    "-frames:v", "1", "-c:v", "mjpeg", "-q:v", "2", "-an", "-sn", "-dn",
+    "out.jpg",
+]
+
+def test_parse_frame_grab_thumbnail():
+    grab = parse_frame_grab(THUMB_CMD)
+    assert grab.input_path == "in.mp4"
+    assert grab.t == 2.5
+    assert grab.filters[-1] == "transpose=1"
+    assert grab.exact is False
+    assert grab.output_path == "out.jpg"
+
+def test_parse_frame_grab_ignores_other_commands():
+    assert parse_frame_grab(["ffmpeg", "-i", "in.mp4", "-f", "hls", "out.m3u8"]) is None
+    assert parse_frame_grab(["ffmpeg", "-i", "in.mp4", "-frames:v", "1", "out.jpg"]) is None
+    assert parse_frame_grab(["ffmpeg", "-ss", "1", "-i", "in.mp4", "-frames:v", "5", "out.jpg"]) is None
+
+def test_apply_filters_rotate_scale_crop():
+    img = Image.new("RGB", (100, 50))
+    out = apply_filters(img, ["transpose=1", "scale=20:20:force_original_aspect_ratio=increase", "crop=20:20"])
+    assert out.size == (20, 20)
+
+def test_apply_filters_rotations_and_flips():
+    img = Image.new("RGB", (2, 1))
+    img.putpixel((0, 0), (255, 0, 0))
+    assert apply_filters(img, ["transpose=2"]).getpixel((0, 1)) == (255, 0, 0)
+    assert apply_filters(img, ["hflip"]).getpixel((1, 0)) == (255, 0, 0)
+    assert apply_filters(img, ["vflip"]).getpixel((0, 0)) == (255, 0, 0)
+
+def test_apply_filters_unsupported_returns_none():
+    assert apply_filters(Image.new("RGB", (10, 10)), ["drawtext=text=x"]) is None
+
+def test_run_falls_back_without_bindings(monkeypatch):
+    calls = []
+    monkeypatch.setattr(nvcodec_runner, "nvc", None)
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+
+    NvCodecRunner().run(THUMB_CMD)
+    assert calls == [THUMB_CMD]
+
+def test_run_decodes_on_gpu(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(nvcodec_runner, "nvc", object())
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+    monkeypatch.setattr(NvCodecRunner, "_decode_frame",
+                        lambda self, path, t: Image.new("RGB", (100, 50), "red"))
+
+    out = tmp_path / "thumb.jpg"
+    NvCodecRunner().run(THUMB_CMD[:-1] + [str(out)])
+    assert calls == []
+    assert Image.open(out).size == (16, 32)
+
+def test_run_keyframe_grab_decodes_exact_frame(monkeypatch, tmp_path):
+    decoded = []
+    monkeypatch.setattr(nvcodec_runner, "nvc", object())
+    monkeypatch.setattr(NvCodecRunner, "_decode_frame",
+                        lambda self, path, t: decoded.append(t) or Image.new("RGB", (100, 50)))
+
+    NvCodecRunner().run(THUMB_CMD[:-1] + [str(tmp_path / "thumb.jpg")])
+    assert decoded == [2.5]
+
+def test_run_falls_back_on_decode_error(monkeypatch):
+    calls = []
+    def bad_decode(self, path, t):
+        raise RuntimeError("nvdec failure")
+    monkeypatch.setattr(nvcodec_runner, "nvc", object())
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+    monkeypatch.setattr(NvCodecRunner, "_decode_frame", bad_decode)
+
+    NvCodecRunner().run(THUMB_CMD)
+    assert calls == [THUMB_CMD]
+
+class _Frame(bytes):
+    """2x2 RGB frame exposing the array interface Image.fromarray reads."""
+    __array_interface__ = {"shape": (2, 2, 3), "typestr": "|u1", "version": 3}
+
+class FakeNvc:
+    """Minimal stand-in for the PyNvVideoCodec module."""
+    class OutputColorType:
+        RGB = "rgb"
+
+    def __init__(self, reconfigure_fails=False):
+        self.calls = []
+        nvc = self
+
+        class SimpleDecoder:
+            def __init__(self, path, **kwargs):
+                nvc.calls.append(("open", path, kwargs))
+
+            def reconfigure_decoder(self, path):
+                nvc.calls.append(("reconfigure", path))
+                if reconfigure_fails:
+                    raise RuntimeError("resolution exceeds decoder limits")
+
+            def get_index_from_time_in_seconds(self, t):
+                return int(t * 10)
+
+            def __getitem__(self, index):
+                nvc.calls.append(("frame", index))
+                return _Frame(bytes(12))
+
+        self.SimpleDecoder = SimpleDecoder
+
+class FakeNumpy:
+    @staticmethod
+    def from_dlpack(frame):
+        return frame
+
+def _clips(tmp_path, *names):
+    paths = [tmp_path / n for n in names]
+    for p in paths:
+        p.write_bytes(b"clip")
+    return [str(p) for p in paths]
+
+def test_decode_frame_reuses_decoder(monkeypatch, tmp_path):
+    nvc = FakeNvc()
+    monkeypatch.setattr(nvcodec_runner, "nvc", nvc)
+    monkeypatch.setattr(nvcodec_runner, "np", FakeNumpy)
+    a, b = _clips(tmp_path, "a.mp4", "b.mp4")
+
+    runner = NvCodecRunner(gpu_id=1)
+    img = runner._decode_frame(a, 1.5)
+    runner._decode_frame(a, 2.0)
+    runner._decode_frame(b, 0.5)
+
+    assert (img.size, img.mode) == ((2, 2), "RGB")
+    assert nvc.calls == [
+        ("open", a, {"gpu_id": 1, "use_device_memory": False, "output_color_type": "rgb"}),
+        ("frame", 15),
+        ("frame", 20),
+        ("reconfigure", b),
+        ("frame", 5),
+    ]
+
+def test_decode_frame_reopens_changed_clip(monkeypatch, tmp_path):
+    nvc = FakeNvc()
+    monkeypatch.setattr(nvcodec_runner, "nvc", nvc)
+    monkeypatch.setattr(nvcodec_runner, "np", FakeNumpy)
+    (a,) = _clips(tmp_path, "a.mp4")
+
+    runner = NvCodecRunner()
+    runner._decode_frame(a, 0)
+    (tmp_path / "a.mp4").write_bytes(b"re-uploaded clip")
+    runner._decode_frame(a, 0)
+    assert ("reconfigure", a) in nvc.calls
+
+def test_decode_frame_reopens_when_reconfigure_fails(monkeypatch, tmp_path):
+    nvc = FakeNvc(reconfigure_fails=True)
+    monkeypatch.setattr(nvcodec_runner, "nvc", nvc)
+    monkeypatch.setattr(nvcodec_runner, "np", FakeNumpy)
+    a, b = _clips(tmp_path, "a.mp4", "b.mp4")
+
+    runner = NvCodecRunner()
+    runner._decode_frame(a, 0)
+    runner._decode_frame(b, 0)
+    assert [c[:2] for c in nvc.calls] == [
+        ("open", a), ("frame", 0), ("reconfigure", b), ("open", b), ("frame", 0),
+    ]
+
+def test_runner_pickles_without_decoder_state():
+    import pickle
+    runner = NvCodecRunner(gpu_id=2)
+    runner._decoder = (("a.mp4", 0, 0), object())
+    clone = pickle.loads(pickle.dumps(runner))
+    assert clone.gpu_id == 2 and clone._decoder is None
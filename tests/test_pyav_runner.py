@@ -0,0 +1,127 @@
+# tests/test_pyav_runner.py
+
+import pytest
+from PIL import Image
+from media_utils import pyav_runner
+from media_utils.pyav_runner import PyAVRunner
+from media_utils.ffmpeg_runner import FFmpegRunner
+from media_utils._frame_grab import parse_frame_grab
+
+THUMB_CMD = [
+    "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-noautorotate",
+    "-ss", "2.5", "-noaccurate_seek", "-skip_frame", "nokey",
+    "-i", "in.mp4",
+    "-map_metadata", "-1", "-map_metadata:s:v:0", "-1",
+    "-vf", "scale=32:16:force_original_aspect_ratio=increase,crop=32:16,transpose=1",
+    "-frames:v", "1", "-c:v", "mjpeg", "-q:v", "2", "-an",
+    "out.jpg",
+]
+
+def test_parse_frame_grab_detects_keyframe_seek():
+    assert parse_frame_grab(THUMB_CMD).exact is False
+    exact_cmd = [a for a in THUMB_CMD if a not in ("-noaccurate_seek", "-skip_frame", "nokey")]
+    assert parse_frame_grab(exact_cmd).exact is True
+
+def test_run_falls_back_without_pyav(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pyav_runner, "av", None)
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+
+    PyAVRunner().run(THUMB_CMD)
+    assert calls == [THUMB_CMD]
+
+def test_run_decodes_in_process(monkeypatch, tmp_path):
+    calls, decoded = [], []
+    def fake_decode(self, path, t, exact):
+        decoded.append((path, t, exact))
+        return Image.new("RGB", (100, 50), "red")
+    monkeypatch.setattr(pyav_runner, "av", object())
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+    monkeypatch.setattr(PyAVRunner, "_decode_frame", fake_decode)
+
+    out = tmp_path / "sub" / "thumb.jpg"
+    PyAVRunner().run(THUMB_CMD[:-1] + [str(out)])
+    assert calls == []
+    assert decoded == [("in.mp4", 2.5, False)]
+    assert Image.open(out).size == (16, 32)
+
+def test_run_passes_other_commands_to_ffmpeg(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pyav_runner, "av", object())
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+    hls = ["ffmpeg", "-i", "in.mp4", "-c", "copy", "-f", "hls", "out.m3u8"]
+
+    PyAVRunner().run(hls)
+    assert calls == [hls]
+
+def test_run_falls_back_on_decode_error(monkeypatch):
+    calls = []
+    def bad_decode(self, path, t, exact):
+        raise RuntimeError("corrupt stream")
+    monkeypatch.setattr(pyav_runner, "av", object())
+    monkeypatch.setattr(FFmpegRunner, "run", lambda self, cmd: calls.append(cmd))
+    monkeypatch.setattr(PyAVRunner, "_decode_frame", bad_decode)
+
+    PyAVRunner().run(THUMB_CMD)
+    assert calls == [THUMB_CMD]
+
+def _write_clip(path, start=0):
+    """3 s, 10 fps, 320x240 test pattern with a keyframe every second, starting at `start` s."""
+    av = pytest.importorskip("av")
+    with av.open("testsrc=size=320x240:rate=10:duration=3", format="lavfi") as src, \
+            av.open(str(path), "w") as out:
+        stream = out.add_stream("mpeg4", rate=10, options={"g": "10"})
+        stream.width, stream.height, stream.pix_fmt = 320, 240, "yuv420p"
+        for i, frame in enumerate(src.decode(video=0)):
+            frame = frame.reformat(format="yuv420p")
+            frame.pict_type = av.video.frame.PictureType.NONE  # lavfi marks every frame as I
+            frame.pts = i + start * 10
+            out.mux(stream.encode(frame))
+        out.mux(stream.encode())
+    return path
+
+@pytest.fixture
+def lavfi_clip(tmp_path):
+    return _write_clip(tmp_path / "clip.mp4")
+
+@pytest.mark.parametrize("exact", [True, False])
+def test_decode_frame_real_clip(lavfi_clip, exact):
+    av = pytest.importorskip("av")
+    img = PyAVRunner()._decode_frame(str(lavfi_clip), 1.55, exact)
+    assert img.size == (320, 240)
+
+    # the returned frame is the first one at/after t, or the keyframe before it
+    with av.open(str(lavfi_clip)) as c:
+        frames = {f.time: f.to_image().tobytes() for f in c.decode(video=0)}
+    expected = 1.6 if exact else 1.0
+    match = min(frames, key=lambda ts: abs(ts - expected))
+    assert img.tobytes() == frames[match]
+
+def test_create_video_thumbnail_with_pyav(lavfi_clip, tmp_path, monkeypatch):
+    from media_utils.videos import create_video_thumbnail
+    def no_ffmpeg(self, cmd):
+        raise AssertionError("fell back to ffmpeg")
+    monkeypatch.setattr(FFmpegRunner, "run", no_ffmpeg)
+    monkeypatch.setattr(FFmpegRunner, "probe",
+                        lambda self, path, **o: {"streams": [{"codec_type": "video", "width": 320,
+                                                              "height": 240, "tags": {"rotate": "90"}}]})
+
+    out = tmp_path / "thumb.jpg"
+    create_video_thumbnail(str(lavfi_clip), str(out), t=2.0, size=(60, 40),
+                           auto_rotate=True, exact=True, runner=PyAVRunner())
+    assert Image.open(out).size == (60, 40)
+
+def test_decode_frame_exact_counts_from_start_time(tmp_path):
+    av = pytest.importorskip("av")
+    clip = _write_clip(tmp_path / "late.mp4", start=10)
+    img = PyAVRunner()._decode_frame(str(clip), 1.55, True)
+
+    with av.open(str(clip)) as c:
+        frames = {round(f.time, 1): f.to_image().tobytes() for f in c.decode(video=0)}
+    assert min(frames) == 10.0
+    assert img.tobytes() == frames[11.6]
+
+def test_decode_frame_exact_past_end_raises(lavfi_clip):
+    pytest.importorskip("av")
+    with pytest.raises(ValueError, match="no video frame at 5"):
+        PyAVRunner()._decode_frame(str(lavfi_clip), 5, True)
@@ -3,6 +3,18 @@
 import pytest
 from media_utils.utils import get_media_mimetype, MimetypeError
 
+@pytest.fixture
+def register_type(monkeypatch):
+    """Register MIME types for one test only; mimetypes' registry is process-global."""
+    import mimetypes
+    from media_utils import utils
+    if not mimetypes.inited:
+        mimetypes.init()
+    monkeypatch.setattr(utils, "_MIME_BY_EXT", {})
+    def register(mime, ext):
+        monkeypatch.setitem(mimetypes.types_map, ext, mime)
+    return register
+
 def test_get_media_mimetype_known_extension():
     # PNG file should return image/png
     mime = get_media_mimetype("example.png")
@@ -36,3 +48,72 @@ def test_get_media_mimetype_guess_fn_raises():
         get_media_mimetype("whatever", guess_fn=broken_guess)
     msg = str(exc.value)
     assert "Error guessing MIME type for 'whatever': boom" in msg
+
+def test_get_media_mimetype_cached_per_extension(monkeypatch):
+    from media_utils import utils
+    utils._MIME_BY_EXT.clear()
+    assert get_media_mimetype("a/clip.MP4") == "video/mp4"
+    assert utils._MIME_BY_EXT == {".mp4": "video/mp4"}
+    monkeypatch.setattr(utils.mimetypes, "guess_type", lambda p: pytest.fail("not cached"))
+    assert get_media_mimetype("b/other.mp4") == "video/mp4"
+    utils._MIME_BY_EXT.clear()
+
+def test_get_media_mimetype_compound_extension_uncached():
+    import mimetypes
+    from media_utils import utils
+    utils._MIME_BY_EXT.clear()
+    assert get_media_mimetype("backup.tar.gz") == mimetypes.guess_type("backup.tar.gz")[0]
+    assert utils._MIME_BY_EXT == {}
+
+def test_get_media_mimetype_unknown_extension_not_cached(register_type):
+    assert get_media_mimetype("a.zzx") is None
+    register_type("application/x-later", ".zzx")
+    assert get_media_mimetype("b.zzx") == "application/x-later"
+
+def test_get_media_mimetype_data_url():
+    assert get_media_mimetype("data:image/png;base64,iVBORw0KGgo=") == "image/png"
+
+def test_get_media_mimetype_default_error_wrapped(monkeypatch):
+    from media_utils import utils
+    utils._MIME_BY_EXT.clear()
+    def broken(path, strict=True):
+        raise RuntimeError("db corrupt")
+    monkeypatch.setattr(utils.mimetypes, "guess_type", broken)
+    with pytest.raises(MimetypeError) as exc:
+        get_media_mimetype("x.never-seen-ext")
+    assert "db corrupt" in str(exc.value)
+    utils._MIME_BY_EXT.clear()
+
+def test_mimetypes_initialised_once_lazily(monkeypatch):
+    from media_utils import utils
+    calls = []
+    monkeypatch.setattr(utils, "_INITED", False)
+    monkeypatch.setattr(utils.mimetypes, "inited", False)
+    monkeypatch.setattr(utils.mimetypes, "init", lambda: calls.append(1))
+
+    get_media_mimetype("a.png")
+    get_media_mimetype("b.gif")
+    assert calls == [1]
+
+def test_mimetypes_not_initialised_for_injected_guess(monkeypatch):
+    from media_utils import utils
+    calls = []
+    monkeypatch.setattr(utils, "_INITED", False)
+    monkeypatch.setattr(utils.mimetypes, "init", lambda: calls.append(1))
+
+    get_media_mimetype("a.png", guess_fn=lambda p: ("image/png", None))
+    assert calls == []
+
+def test_mimetypes_init_keeps_registered_types(monkeypatch, register_type):
+    import mimetypes
+    from media_utils import utils
+    monkeypatch.setattr(utils, "_INITED", False)
+    register_type("application/x-custom", ".zzq")
+
+    assert get_media_mimetype("a.zzq") == "application/x-custom"
+    assert mimetypes.guess_type("b.zzq")[0] == "application/x-custom"
+
+@pytest.mark.parametrize("ext", [".zzx", ".zzq"])
+def test_registered_types_do_not_leak(ext):
+    import mimetypes
+    assert mimetypes.guess_type(f"x{ext}")[0] is None
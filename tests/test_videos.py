@@ -1,15 +1,21 @@
 # tests/test_videos.py
 
+import collections
 import pytest
 from pathlib import Path
 from media_utils.videos import (
     _probe_stream,
+    _build_vf,
+    probe_streams,
     create_video_thumbnail,
     ThumbnailError,
     create_gif_preview,
     GIFError,
     convert_to_hls,
+    convert_to_hls_ladder,
     HLSError,
+    create_all_derivatives,
+    DerivativesError,
     RESOLUTION_MAP
 )
 from media_utils.ffmpeg_runner import FFmpegRunner, FFmpegError
@@ -17,16 +23,24 @@ from media_utils.ffmpeg_runner import FFmpegRunner, FFmpegError
 # --- Helpers ---
 
 class DummyRunner(FFmpegRunner):
+    """
+    Records commands instead of running them. Like ffmpeg it leaves a file at
+    the output path, which create_video_thumbnail requires of every runner.
+    """
     def __init__(self, info):
         self.info = info
-        self.commands = []
+        self.commands = collections.deque()
         super().__init__()
 
-    def probe(self, path: Path):
+    def probe(self, path: Path, **options):
         return self.info
 
     def run(self, cmd):
         self.commands.append(cmd)
+        # like ffmpeg, leave a non-empty output behind
+        out = Path(cmd[-1])
+        if out.is_absolute() and out.parent.is_dir():
+            out.write_bytes(b"\xff")
 
 class ErrorOnFirstRunRunner(DummyRunner):
     def __init__(self, info):
@@ -68,11 +82,73 @@ def test_probe_stream_no_rotation():
 
 def test_probe_stream_error_returns_zero():
     class BadRunner(FFmpegRunner):
-        def probe(self, path):
+        def probe(self, path, **options):
             raise FFmpegError("probe fail")
     w, h, rot = _probe_stream(Path("in.mp4"), BadRunner())
     assert (w, h, rot) == (0, 0, 0)
 
+def test_probe_stream_selects_first_video_stream():
+    class OptionsRunner(DummyRunner):
+        def probe(self, path, **options):
+            self.options = options
+            return self.info
+    runner = OptionsRunner({"streams": [
+        {"codec_type": "video", "width": 10, "height": 20, "tags": {"rotate": "-90"}}
+    ]})
+    assert _probe_stream(Path("in.mp4"), runner) == (10, 20, -90)
+    assert runner.options == {"select_streams": "v:0"}
+
+def test_probe_stream_with_legacy_probe_signature():
+    class LegacyRunner(FFmpegRunner):
+        def probe(self, path):
+            return {"streams": [
+                {"codec_type": "audio"},
+                {"codec_type": "video", "width": 640, "height": 360, "tags": {"rotate": "90"}},
+            ]}
+    assert _probe_stream(Path("in.mp4"), LegacyRunner()) == (640, 360, 90)
+
+def test_probe_stream_malformed_dimensions():
+    runner = DummyRunner({"streams": [{"codec_type": "video", "width": "n/a", "height": 20}]})
+    assert _probe_stream(Path("in.mp4"), runner) == (0, 0, 0)
+
+def test_probe_stream_returns_named_result():
+    runner = DummyRunner({"streams": [
+        {"codec_type": "video", "width": 640, "height": 360, "tags": {"rotate": "90"}}
+    ]})
+    result = _probe_stream(Path("in.mp4"), runner)
+    assert (result.width, result.height, result.rotation) == (640, 360, 90)
+    assert result == (640, 360, 90)
+
+def test_probe_stream_without_video_stream():
+    runner = DummyRunner({"streams": [{"codec_type": "audio"}]})
+    assert _probe_stream(Path("in.mp3"), runner) == (0, 0, 0)
+
+def test_probe_streams_keeps_input_order():
+    class PathRunner(FFmpegRunner):
+        def probe(self, path, **options):
+            if path.name == "bad.mp4":
+                raise FFmpegError("probe fail")
+            n = int(path.stem)
+            return {"streams": [{"codec_type": "video", "width": n, "height": 2 * n}]}
+    paths = [Path(f"{n}.mp4") for n in range(1, 20)] + [Path("bad.mp4")]
+    result = probe_streams(paths, PathRunner(), max_workers=4)
+    assert result[:19] == [(n, 2 * n, 0) for n in range(1, 20)]
+    assert result[19] == (0, 0, 0)
+
+
+@pytest.mark.parametrize("raw,size,auto_rotate,head,expected", [
+    (0, None, False, (), ""),
+    (90, None, False, (), ""),
+    (90, None, True, (), "transpose=2"),
+    (0, (16, 32), True, (), "scale=16:32:force_original_aspect_ratio=increase,crop=16:32"),
+    (-90, (16, 32), True, ("fps=5",),
+     "fps=5,scale=32:16:force_original_aspect_ratio=increase,crop=32:16,transpose=1"),
+    (180, (16, 32), True, (),
+     "scale=16:32:force_original_aspect_ratio=increase,crop=16:32,hflip,vflip"),
+])
+def test_build_vf(raw, size, auto_rotate, head, expected):
+    assert _build_vf(raw, size, auto_rotate, *head) == expected
+
 
 # --- create_video_thumbnail tests ---
 
@@ -96,6 +172,47 @@ def test_create_video_thumbnail_default(tmp_path):
     assert "-frames:v" in cmd and "1" in cmd
     assert str(out) in cmd
 
+def test_create_gif_preview_rotate_after_scale(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "out.gif"
+    info = {"streams": [
+        {"codec_type": "video", "width": 1920, "height": 1080, "tags": {"rotate": "90"}, "side_data_list": []}
+    ]}
+    runner = DummyRunner(info)
+
+    create_gif_preview(str(inp), str(out), fps=5, size=(300, 400), auto_rotate=True, runner=runner)
+
+    graph = runner.commands[0][runner.commands[0].index("-filter_complex") + 1]
+    assert graph.startswith(
+        "[0:v]fps=5,scale=400:300:force_original_aspect_ratio=increase,crop=400:300,transpose=2,split"
+    )
+
+def test_create_video_thumbnail_keyframe_seek(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "thumb.jpg"
+    runner = DummyRunner({"streams": []})
+
+    create_video_thumbnail(str(inp), str(out), t=3.0, runner=runner)
+
+    cmd = runner.commands[0]
+    # keyframe-only decode, configured as input options
+    assert cmd.index("-skip_frame") < cmd.index("-i")
+    assert cmd[cmd.index("-skip_frame") + 1] == "nokey"
+    assert "-noaccurate_seek" in cmd
+    assert {"-an", "-sn", "-dn"} <= set(cmd)
+
+def test_create_video_thumbnail_exact(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "thumb.jpg"
+    runner = DummyRunner({"streams": []})
+
+    create_video_thumbnail(str(inp), str(out), t=3.0, exact=True, runner=runner)
+
+    cmd = runner.commands[0]
+    assert "-skip_frame" not in cmd
+    assert "-noaccurate_seek" not in cmd
+    assert cmd[cmd.index("-ss") + 1] == "3.0"
+
 def test_create_video_thumbnail_auto_rotate_and_size(tmp_path):
     inp = tmp_path / "in.mp4"; inp.write_text("")
     out = tmp_path / "thumb.jpg"
@@ -109,10 +226,9 @@ def test_create_video_thumbnail_auto_rotate_and_size(tmp_path):
 
     cmd = runner.commands[0]
     assert "-ss" in cmd and "2.5" in cmd
-    # ensure vf includes transpose and scale/crop
+    # scale/crop in stored orientation (axes swapped), rotate last
     vf = cmd[cmd.index("-vf")+1]
-    assert "transpose=1" in vf
-    assert "scale=16:32" in vf
+    assert vf == "scale=32:16:force_original_aspect_ratio=increase,crop=32:16,transpose=1"
 
 def test_create_video_thumbnail_mkdir_failure(tmp_path, monkeypatch):
     inp = tmp_path / "in.mp4"; inp.write_text("")
@@ -150,7 +266,8 @@ def test_create_gif_preview_success(tmp_path):
     ]}
     runner = DummyRunner(info)
 
-    create_gif_preview(str(inp), str(out), start=1, duration=2, fps=5, size=(10,10), runner=runner)
+    create_gif_preview(str(inp), str(out), start=1, duration=2, fps=5, size=(10,10),
+                       single_pass=False, runner=runner)
 
     # two commands recorded
     assert len(runner.commands) == 2
@@ -177,7 +294,7 @@ def test_create_gif_preview_palette_failure(tmp_path):
     runner = ErrorOnFirstRunRunner(info)  # fails on first run
 
     with pytest.raises(GIFError) as exc:
-        create_gif_preview(str(inp), str(out), runner=runner)
+        create_gif_preview(str(inp), str(out), single_pass=False, runner=runner)
     assert "Palette generation failed" in str(exc.value)
 
 def test_create_gif_preview_gif_failure(tmp_path):
@@ -193,6 +310,35 @@ def test_create_gif_preview_gif_failure(tmp_path):
                 raise FFmpegError("gif-fail")
 
     runner = SecondFailRunner(info)
+    with pytest.raises(GIFError) as exc:
+        create_gif_preview(str(inp), str(out), single_pass=False, runner=runner)
+    assert "GIF creation failed" in str(exc.value)
+
+def test_create_gif_preview_single_pass(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "out.gif"
+
+    info = {"streams": [
+        {"codec_type": "video", "width": 50, "height": 50, "tags": {}, "side_data_list": []}
+    ]}
+    runner = DummyRunner(info)
+
+    create_gif_preview(str(inp), str(out), start=1, duration=2, fps=5, size=(10,10), runner=runner)
+
+    # palettegen and paletteuse fused into one invocation, no palette file
+    assert len(runner.commands) == 1
+    cmd = runner.commands[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]fps=5,scale=10:10")
+    assert "split[a][b];[a]fps=2,scale=iw/2:ih/2:flags=area,palettegen=stats_mode=diff[p];[b][p]paletteuse" in graph
+    assert cmd.count("-i") == 1
+    assert cmd[-1] == str(out)
+
+def test_create_gif_preview_single_pass_failure(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "out.gif"
+    runner = ErrorOnFirstRunRunner({"streams": []})
+
     with pytest.raises(GIFError) as exc:
         create_gif_preview(str(inp), str(out), runner=runner)
     assert "GIF creation failed" in str(exc.value)
@@ -213,7 +359,7 @@ def test_create_gif_preview_cleanup_failure(tmp_path, monkeypatch):
     monkeypatch.setattr(Path, "unlink", lambda self: (_ for _ in ()).throw(OSError()), raising=False)
 
     # should not raise
-    create_gif_preview(str(inp), str(out), runner=runner)
+    create_gif_preview(str(inp), str(out), single_pass=False, runner=runner)
 
 
 # --- convert_to_hls tests ---
@@ -266,6 +412,8 @@ def test_convert_to_hls_auto_rotate(tmp_path):
     cmd = runner.commands[0]
     assert "-vf" in cmd and "transpose=2" in cmd
     assert "-c:v" in cmd and "libx264" in cmd
+    assert cmd[cmd.index("-preset") + 1] == "faster"
+    assert cmd[cmd.index("-pix_fmt") + 1] == "yuv420p"
 
 def test_convert_to_hls_downscale_resolution(tmp_path):
     inp = tmp_path / "in.mp4"; inp.write_text("")
@@ -334,8 +482,8 @@ def test_create_video_thumbnail_auto_rotate_180(tmp_path):
 
     cmd = runner.commands[0]
     vf = cmd[cmd.index("-vf") + 1]
-    # 180 should map to double transpose
-    assert vf == "transpose=1,transpose=1"
+    # 180 maps to a horizontal + vertical flip
+    assert vf == "hflip,vflip"
 
 def test_create_video_thumbnail_auto_rotate_neg180(tmp_path):
     inp = tmp_path / "in.mp4"; inp.write_text("")
@@ -355,16 +503,16 @@ def test_create_video_thumbnail_auto_rotate_neg180(tmp_path):
 
     cmd = runner.commands[0]
     vf = cmd[cmd.index("-vf") + 1]
-    # negative 180 also double-transpose
-    assert vf == "transpose=1,transpose=1"
+    # negative 180 also flips both axes
+    assert vf == "hflip,vflip"
 
-@pytest.mark.parametrize("rot_tag,expected_prefix", [
+@pytest.mark.parametrize("rot_tag,expected_suffix", [
     (-90, "transpose=1"),
     (90,  "transpose=2"),
-    (180, "transpose=1,transpose=1"),
-    (-180,"transpose=1,transpose=1"),
+    (180, "hflip,vflip"),
+    (-180,"hflip,vflip"),
 ])
-def test_create_gif_preview_auto_rotate_transpose_branches(tmp_path, rot_tag, expected_prefix):
+def test_create_gif_preview_auto_rotate_transpose_branches(tmp_path, rot_tag, expected_suffix):
     # Prepare dummy input/output
     inp = tmp_path / "in.mp4"
     inp.write_text("")
@@ -384,6 +532,7 @@ def test_create_gif_preview_auto_rotate_transpose_branches(tmp_path, rot_tag, ex
         start=0, duration=1, fps=1,
         size=(10, 10),
         auto_rotate=True,
+        single_pass=False,
         runner=runner
     )
 
@@ -391,16 +540,47 @@ def test_create_gif_preview_auto_rotate_transpose_branches(tmp_path, rot_tag, ex
     cmd1 = runner.commands[0]
     # locate the -vf argument
     vf_arg = cmd1[cmd1.index("-vf") + 1]
-    # vf_arg ends with ",palettegen", so strip that
-    vf_chain = vf_arg.rsplit(",palettegen", 1)[0]
-    assert vf_chain.startswith(expected_prefix), \
-        f"expected filter to start with '{expected_prefix}', got '{vf_chain}'"
+    # vf_arg ends with the palette sampling chain (",fps=…,palettegen=…"), so strip that
+    assert vf_arg.endswith(",fps=1,scale=iw/2:ih/2:flags=area,palettegen=stats_mode=diff")
+    vf_chain = vf_arg.rsplit(",fps=", 1)[0]
+    # rotation runs last, on the already downscaled frames
+    assert vf_chain.startswith("fps=1,scale=10:10")
+    assert vf_chain.endswith(expected_suffix), \
+        f"expected filter to end with '{expected_suffix}', got '{vf_chain}'"
+
+@pytest.mark.parametrize("rot_tag,expected_suffix", [
+    (-90, "transpose=1"),
+    (90,  "transpose=2"),
+    (180, "hflip,vflip"),
+    (-180,"hflip,vflip"),
+])
+def test_create_gif_preview_single_pass_rotate_branches(tmp_path, rot_tag, expected_suffix):
+    inp = tmp_path / "in.mp4"
+    inp.write_text("")
+    out = tmp_path / "out.gif"
+    info = {"streams": [
+        {"codec_type": "video", "width": 100, "height": 100,
+         "tags": {"rotate": str(rot_tag)}, "side_data_list": []}
+    ]}
+    runner = DummyRunner(info)
+
+    create_gif_preview(str(inp), str(out), start=0, duration=1, fps=1,
+                       size=(10, 10), auto_rotate=True, runner=runner)
+
+    # one command, one decode: the rotated chain feeds both palette branches
+    assert len(runner.commands) == 1
+    cmd = runner.commands[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    chain, _, rest = graph.partition(",split[a][b];")
+    assert chain == f"[0:v]fps=1,scale=10:10:force_original_aspect_ratio=increase,crop=10:10,{expected_suffix}"
+    assert rest.endswith("[b][p]paletteuse")
+    assert not out.with_suffix(".png").exists()
 
 @pytest.mark.parametrize("rot_tag,expected_prefix", [
     (-90, "transpose=1"),
     (90,  "transpose=2"),
-    (180, "transpose=1,transpose=1"),
-    (-180,"transpose=1,transpose=1"),
+    (180, "hflip,vflip"),
+    (-180,"hflip,vflip"),
 ])
 def test_convert_to_hls_auto_rotate_transpose_branches(tmp_path, rot_tag, expected_prefix):
     inp = tmp_path / "in.mp4"
@@ -421,7 +601,7 @@ def test_convert_to_hls_auto_rotate_transpose_branches(tmp_path, rot_tag, expect
     assert "-vf" in cmd
     vf = cmd[cmd.index("-vf")+1]
 
-    # Use startswith so "transpose=1,transpose=1" passes as well
+    # Use startswith so multi-filter chains like "hflip,vflip" pass as well
     assert vf.startswith(expected_prefix), f"Expected '{vf}' to start with '{expected_prefix}'"
 
 def test_convert_to_hls_portrait_resolution_swap(tmp_path):
@@ -450,3 +630,451 @@ def test_convert_to_hls_portrait_resolution_swap(tmp_path):
 
     # Verify that the scale filter uses the swapped dimensions 480:854
     assert "scale=480:854" in vf, f"Got filter '{vf}', expected swap to 480:854"
+
+class GPURunner(DummyRunner):
+    def __init__(self, info, encoders=("h264_nvenc",)):
+        super().__init__(info)
+        self.encoders = set(encoders)
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+def test_convert_to_hls_gpu_pipeline(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    info = {"streams": [
+        {"codec_type":"video","width":1000,"height":2000,"tags":{"rotate":"-90"},"side_data_list":[]}
+    ]}
+    runner = GPURunner(info)
+    convert_to_hls(str(inp), str(out_dir), "base", resolution="720p",
+                   auto_rotate=True, use_gpu=True, runner=runner)
+
+    cmd = runner.commands[0]
+    # CUDA decode flags come before the input
+    assert cmd.index("-hwaccel") < cmd.index("-i")
+    assert cmd[cmd.index("-hwaccel_output_format") + 1] == "cuda"
+    vf = cmd[cmd.index("-vf") + 1]
+    assert vf.startswith("transpose_npp=clock")
+    assert "scale_npp=1280:720" in vf
+    assert cmd[cmd.index("-c:v") + 1] == "h264_nvenc"
+    assert "libx264" not in cmd
+
+def test_convert_to_hls_gpu_falls_back_without_nvenc(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    info = {"streams": [
+        {"codec_type":"video","width":100,"height":200,"tags":{"rotate":"90"},"side_data_list":[]}
+    ]}
+    runner = GPURunner(info, encoders=())
+    convert_to_hls(str(inp), str(out_dir), "base", auto_rotate=True, use_gpu=True, runner=runner)
+
+    cmd = runner.commands[0]
+    assert "-hwaccel" not in cmd
+    assert cmd[cmd.index("-vf") + 1] == "transpose=2"
+    assert "libx264" in cmd
+
+class GPUFailRunner(GPURunner):
+    def run(self, cmd):
+        if "-hwaccel" in cmd:
+            self.commands.append(cmd)
+            raise FFmpegError("scale_npp: unsupported input format")
+        super().run(cmd)
+
+def test_convert_to_hls_gpu_failure_retries_in_software(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    info = {"streams": [
+        {"codec_type":"video","width":1920,"height":1080,"tags":{},"side_data_list":[]}
+    ]}
+    runner = GPUFailRunner(info)
+    convert_to_hls(str(inp), str(out_dir), "base", resolution="720p", use_gpu=True, runner=runner)
+
+    assert len(runner.commands) == 2
+    gpu, cpu = runner.commands
+    assert "scale_npp" in gpu[gpu.index("-vf") + 1]
+    assert "-hwaccel" not in cpu
+    assert cpu[cpu.index("-vf") + 1].startswith("scale=1280:720")
+    assert "libx264" in cpu
+
+def test_convert_to_hls_software_failure_not_retried(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    info = {"streams": [
+        {"codec_type":"video","width":1920,"height":1080,"tags":{},"side_data_list":[]}
+    ]}
+    class AlwaysFailRunner(GPURunner):
+        def run(self, cmd):
+            self.commands.append(cmd)
+            raise FFmpegError("boom")
+    runner = AlwaysFailRunner(info, encoders=())
+    with pytest.raises(HLSError):
+        convert_to_hls(str(inp), str(tmp_path / "hls"), "base", resolution="720p",
+                       use_gpu=True, runner=runner)
+    assert len(runner.commands) == 1
+
+def test_convert_to_hls_gpu_copy_when_no_filters(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    info = {"streams": [
+        {"codec_type":"video","width":640,"height":360,"tags":{},"side_data_list":[]}
+    ]}
+    runner = GPURunner(info)
+    convert_to_hls(str(inp), str(out_dir), "base", use_gpu=True, runner=runner)
+
+    cmd = runner.commands[0]
+    assert "-hwaccel" not in cmd
+    assert "-c" in cmd and "copy" in cmd
+
+
+# --- convert_to_hls_ladder tests ---
+
+def _ladder_info(width, height, audio=True):
+    streams = [{"codec_type": "video", "width": width, "height": height, "tags": {}, "side_data_list": []}]
+    if audio:
+        streams.append({"codec_type": "audio"})
+    return {"streams": streams}
+
+def test_convert_to_hls_ladder_single_invocation(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    runner = DummyRunner(_ladder_info(1920, 1080))
+
+    convert_to_hls_ladder(str(inp), str(out_dir), "base", runner=runner)
+
+    assert len(runner.commands) == 1
+    cmd = runner.commands[0]
+    assert cmd.count("-i") == 1
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]split=3[v0][v1][v2]")
+    assert "[v0]scale=854:480" in graph
+    assert "[v1]scale=1280:720" in graph
+    # source already 1080p: passed through unscaled
+    assert "[v2]null[v2o]" in graph
+    assert cmd[cmd.index("-var_stream_map") + 1] == \
+        "v:0,a:0,name:480p v:1,a:1,name:720p v:2,a:2,name:1080p"
+    assert cmd.count("0:a:0") == 3
+    assert cmd[cmd.index("-master_pl_name") + 1] == "base.m3u8"
+    assert cmd[-1] == str(out_dir / "base_%v.m3u8")
+    assert cmd[cmd.index("-maxrate:v:1") + 1] == "3000k"
+
+def test_convert_to_hls_ladder_skips_upscales(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    runner = DummyRunner(_ladder_info(1280, 720))
+
+    convert_to_hls_ladder(str(inp), str(out_dir), "base", ladder=["1080p", "720p", "480p", "4k"], runner=runner)
+
+    cmd = runner.commands[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]split=2[v0][v1]")
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,a:0,name:480p v:1,a:1,name:720p"
+
+def test_convert_to_hls_ladder_portrait_rotated_no_audio(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    info = _ladder_info(1920, 1080, audio=False)
+    info["streams"][0]["tags"] = {"rotate": "90"}
+    runner = DummyRunner(info)
+
+    convert_to_hls_ladder(str(inp), str(out_dir), "base", ladder=["480p"], auto_rotate=True, runner=runner)
+
+    cmd = runner.commands[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]transpose=2,split=1[v0]")
+    assert "scale=480:854" in graph
+    assert "0:a:0" not in cmd
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,name:480p"
+
+def test_convert_to_hls_ladder_gpu(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    runner = GPURunner(_ladder_info(1920, 1080))
+
+    convert_to_hls_ladder(str(inp), str(out_dir), "base", ladder=["720p"], use_gpu=True, runner=runner)
+
+    cmd = runner.commands[0]
+    assert cmd.index("-hwaccel") < cmd.index("-i")
+    assert "scale_npp=1280:720" in cmd[cmd.index("-filter_complex") + 1]
+    assert cmd[cmd.index("-c:v") + 1] == "h264_nvenc"
+
+def test_convert_to_hls_ladder_invalid(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner(_ladder_info(100, 100))
+    with pytest.raises(ValueError):
+        convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", ladder=["720p", "999p"], runner=runner)
+    with pytest.raises(ValueError):
+        convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", ladder=[], runner=runner)
+
+def test_convert_to_hls_ladder_runner_error(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = ErrorOnFirstRunRunner(_ladder_info(1920, 1080))
+    with pytest.raises(HLSError) as exc:
+        convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", runner=runner)
+    assert "HLS ladder conversion failed" in str(exc.value)
+
+def test_convert_to_hls_ladder_mkdir_failure(tmp_path, monkeypatch):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner(_ladder_info(1920, 1080))
+    monkeypatch.setattr(Path, "mkdir", lambda self,*a,**k: (_ for _ in ()).throw(OSError("fail")), raising=False)
+
+    with pytest.raises(HLSError, match="Could not create output directory"):
+        convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", runner=runner)
+
+def test_convert_to_hls_ladder_probe_failure(tmp_path):
+    class ProbeErrorRunner(DummyRunner):
+        def probe(self, path, **options):
+            raise FFmpegError("ffprobe broken")
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = ProbeErrorRunner({})
+
+    convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", ladder=["720p"], runner=runner)
+    cmd = runner.commands[0]
+    assert "0:a:0" not in cmd
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,name:720p"
+
+def test_default_runner_is_shared(tmp_path, monkeypatch):
+    import media_utils.videos as videos
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner({"streams": []})
+    monkeypatch.setattr(videos, "default_runner", lambda: runner)
+
+    videos.create_video_thumbnail(str(inp), str(tmp_path / "t.jpg"))
+    videos.create_gif_preview(str(inp), str(tmp_path / "p.gif"))
+    videos.convert_to_hls(str(inp), str(tmp_path / "hls"), "base")
+
+    assert len(runner.commands) == 3
+
+def test_resolution_map_is_read_only():
+    with pytest.raises(TypeError):
+        RESOLUTION_MAP["720p"] = (1, 1)
+    assert RESOLUTION_MAP["720p"] == (1280, 720)
+
+def test_hls_maxrate_table_is_read_only():
+    from media_utils.videos import _HLS_MAXRATE_KBPS
+    with pytest.raises(TypeError):
+        _HLS_MAXRATE_KBPS["720p"] = 1
+    assert set(_HLS_MAXRATE_KBPS) == set(RESOLUTION_MAP)
+
+def test_convert_to_hls_resolution_case_insensitive(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner({"streams": [
+        {"codec_type":"video","width":2000,"height":1000,"tags":{},"side_data_list":[]}
+    ]})
+    convert_to_hls(str(inp), str(tmp_path / "hls"), "base", resolution="720P", runner=runner)
+    assert "scale=1280:720" in runner.commands[0][runner.commands[0].index("-vf") + 1]
+
+def test_convert_to_hls_fmp4_segments(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    runner = DummyRunner({"streams": [
+        {"codec_type": "video", "width": 1920, "height": 1080, "tags": {}, "side_data_list": []}
+    ]})
+
+    convert_to_hls(str(inp), str(out_dir), "base", segment_format="fmp4", runner=runner)
+
+    cmd = runner.commands[0]
+    assert cmd[cmd.index("-hls_segment_type") + 1] == "fmp4"
+    assert cmd[cmd.index("-hls_fmp4_init_filename") + 1] == "base_init.mp4"
+    assert cmd[cmd.index("-hls_flags") + 1] == "independent_segments+temp_file"
+    assert cmd[cmd.index("-hls_segment_filename") + 1] == str(out_dir / "base%d.m4s")
+    assert cmd[-1] == str(out_dir / "base.m3u8")
+
+def test_convert_to_hls_ladder_fmp4_segments(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out_dir = tmp_path / "hls"
+    runner = DummyRunner(_ladder_info(1920, 1080))
+
+    convert_to_hls_ladder(str(inp), str(out_dir), "base", segment_format="fmp4", runner=runner)
+
+    cmd = runner.commands[0]
+    assert cmd[cmd.index("-hls_fmp4_init_filename") + 1] == "base_%v_init.mp4"
+    assert cmd[cmd.index("-hls_segment_filename") + 1] == str(out_dir / "base_%v_%d.m4s")
+
+def test_convert_to_hls_invalid_segment_format(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner({"streams": []})
+    with pytest.raises(ValueError):
+        convert_to_hls(str(inp), str(tmp_path / "hls"), "base", segment_format="mkv", runner=runner)
+    assert not runner.commands
+
+def test_convert_to_hls_reuses_args_template(tmp_path):
+    from media_utils import videos
+    videos._hls_args_template.cache_clear()
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner({"streams": [
+        {"codec_type": "video", "width": 2000, "height": 1000, "tags": {}, "side_data_list": []}
+    ]})
+
+    convert_to_hls(str(inp), str(tmp_path / "a"), "a", resolution="360p", runner=runner)
+    convert_to_hls(str(inp), str(tmp_path / "b"), "b", resolution="360p", runner=runner)
+
+    assert videos._hls_args_template.cache_info().hits == 1
+    first, second = runner.commands
+    assert first[-1] != second[-1]
+    assert first[first.index("-vf"):first.index("-hls_list_size")] == \
+        second[second.index("-vf"):second.index("-hls_list_size")]
+
+class DerivativesRunner(DummyRunner):
+    """Also writes the thumbnail and GIF of a create_all_derivatives command."""
+    def run(self, cmd):
+        super().run(cmd)
+        for arg in cmd:
+            if arg.endswith((".jpg", ".gif")) and Path(arg).is_absolute():
+                Path(arg).write_bytes(b"\xff")
+
+def test_create_all_derivatives_single_invocation(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DerivativesRunner({"streams": [
+        {"codec_type": "video", "width": 1920, "height": 1080, "tags": {"rotate": "90"}}
+    ]})
+
+    create_all_derivatives(
+        str(inp), str(tmp_path / "t.jpg"), str(tmp_path / "p.gif"), str(tmp_path / "hls"), "base",
+        t=2, thumb_size=(100, 80), gif_start=1, gif_duration=2, gif_fps=5,
+        resolution="720p", auto_rotate=True, runner=runner,
+    )
+
+    assert len(runner.commands) == 1
+    cmd = runner.commands[0]
+    assert cmd.count("-i") == 1
+    graph = cmd[cmd.index("-filter_complex") + 1].split(";")
+    assert graph[0] == "[0:v]split=3[t][g][h]"
+    assert graph[1] == ("[t]trim=start=2,scale=80:100:force_original_aspect_ratio=increase,"
+                        "crop=80:100,transpose=2[thumb]")
+    assert graph[2].startswith("[g]trim=start=1:duration=2,setpts=PTS-STARTPTS,fps=5,transpose=2,split")
+    assert graph[-1].startswith("[h]transpose=2,scale=720:1280:")
+    assert cmd[cmd.index("[thumb]") + 1:].index(str(tmp_path / "t.jpg")) > 0
+    assert cmd[-1] == str(tmp_path / "hls" / "base.m3u8")
+    assert "libx264" in cmd
+
+def test_create_all_derivatives_copies_unfiltered_hls(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DerivativesRunner({"streams": [
+        {"codec_type": "video", "width": 640, "height": 360, "tags": {}}
+    ]})
+    create_all_derivatives(str(inp), str(tmp_path / "t.jpg"), str(tmp_path / "p.gif"),
+                           str(tmp_path / "hls"), "base", runner=runner)
+
+    cmd = runner.commands[0]
+    assert cmd[cmd.index("-filter_complex") + 1].startswith("[0:v]split=2[t][g];")
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert "0:v:0" in cmd
+
+def test_create_all_derivatives_errors(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    info = {"streams": [{"codec_type": "video", "width": 640, "height": 360}]}
+    args = (str(inp), str(tmp_path / "t.jpg"), str(tmp_path / "p.gif"), str(tmp_path / "hls"), "base")
+
+    with pytest.raises(ValueError):
+        create_all_derivatives(*args, resolution="9000p", runner=DummyRunner(info))
+    with pytest.raises(DerivativesError, match="Derivative generation failed"):
+        create_all_derivatives(*args, runner=ErrorOnFirstRunRunner(info))
+
+def test_create_all_derivatives_missing_output(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    thumb = tmp_path / "t.jpg"; thumb.write_bytes(b"stale")
+    info = {"streams": [{"codec_type": "video", "width": 640, "height": 360}]}
+
+    # DummyRunner writes only the playlist, as ffmpeg does when t is past the end
+    with pytest.raises(DerivativesError, match="no output at .*t.jpg, .*p.gif"):
+        create_all_derivatives(str(inp), str(thumb), str(tmp_path / "p.gif"),
+                               str(tmp_path / "hls"), "base", t=20, runner=DummyRunner(info))
+    assert not thumb.exists()
+
+def test_create_all_derivatives_mkdir_failure(tmp_path, monkeypatch):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    info = {"streams": [{"codec_type": "video", "width": 640, "height": 360}]}
+    monkeypatch.setattr(Path, "mkdir", lambda self,*a,**k: (_ for _ in ()).throw(OSError("fail")), raising=False)
+
+    with pytest.raises(DerivativesError, match="Could not create output directory"):
+        create_all_derivatives(str(inp), str(tmp_path / "t" / "t.jpg"), str(tmp_path / "p.gif"),
+                               str(tmp_path / "hls"), "base", runner=DummyRunner(info))
+
+class NoKeyframeOutputRunner(DummyRunner):
+    """Keyframe-only grabs write nothing, as ffmpeg does past the last keyframe."""
+    def run(self, cmd):
+        if "-noaccurate_seek" in cmd:
+            self.commands.append(cmd)
+        else:
+            super().run(cmd)
+
+def test_create_video_thumbnail_retries_exact_when_keyframe_grab_is_empty(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "thumb.jpg"
+    out.write_bytes(b"stale thumbnail of a previous upload")
+    runner = NoKeyframeOutputRunner({"streams": [
+        {"codec_type": "video", "width": 64, "height": 64, "tags": {}}
+    ]})
+
+    create_video_thumbnail(str(inp), str(out), t=7.5, runner=runner)
+
+    first, second = runner.commands
+    assert "-noaccurate_seek" in first
+    assert "-noaccurate_seek" not in second and "-skip_frame" not in second
+    assert out.read_bytes() == b"\xff"
+
+def test_create_video_thumbnail_cannot_replace_output(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    out = tmp_path / "thumb.jpg"; out.mkdir()
+    with pytest.raises(ThumbnailError, match="Could not replace"):
+        create_video_thumbnail(str(inp), str(out), runner=DummyRunner({"streams": []}))
+
+def test_create_video_thumbnail_no_frame_raises(tmp_path):
+    class EmptyOutputRunner(DummyRunner):
+        def run(self, cmd):
+            self.commands.append(cmd)
+            Path(cmd[-1]).write_bytes(b"")
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = EmptyOutputRunner({"streams": []})
+    with pytest.raises(ThumbnailError, match="no frame at 99"):
+        create_video_thumbnail(str(inp), str(tmp_path / "t.jpg"), t=99, runner=runner)
+    assert len(runner.commands) == 2
+
+@pytest.mark.parametrize("rot", [180, -180])
+def test_hls_180_rotation_keeps_orientation(tmp_path, rot):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    info = {"streams": [
+        {"codec_type": "video", "width": 640, "height": 360, "tags": {"rotate": str(rot)}}
+    ]}
+
+    runner = DummyRunner(info)
+    convert_to_hls_ladder(str(inp), str(tmp_path / "ladder"), "base", ladder=["240p"],
+                          auto_rotate=True, runner=runner)
+    graph = runner.commands[0][runner.commands[0].index("-filter_complex") + 1]
+    assert "hflip,vflip" in graph
+    assert "scale=426:240:" in graph
+
+    runner = DummyRunner(info)
+    convert_to_hls(str(inp), str(tmp_path / "single"), "base", resolution="240p",
+                   auto_rotate=True, runner=runner)
+    vf = runner.commands[0][runner.commands[0].index("-vf") + 1]
+    assert vf.startswith("hflip,vflip,scale=426:240:")
+
+    runner = DerivativesRunner(info)
+    create_all_derivatives(str(inp), str(tmp_path / "t.jpg"), str(tmp_path / "p.gif"),
+                           str(tmp_path / "all"), "base", resolution="240p",
+                           auto_rotate=True, runner=runner)
+    graph = runner.commands[0][runner.commands[0].index("-filter_complex") + 1]
+    assert "[h]hflip,vflip,scale=426:240:" in graph
+
+def test_convert_to_hls_ladder_gpu_failure_retries_in_software(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = GPUFailRunner(_ladder_info(1920, 1080))
+
+    convert_to_hls_ladder(str(inp), str(tmp_path / "hls"), "base", ladder=["720p"],
+                          use_gpu=True, runner=runner)
+
+    assert len(runner.commands) == 2
+    cpu = runner.commands[1]
+    assert "-hwaccel" not in cpu
+    assert "scale_npp" not in cpu[cpu.index("-filter_complex") + 1]
+    assert "libx264" in cpu
+
+def test_commands_log_errors_only(tmp_path):
+    inp = tmp_path / "in.mp4"; inp.write_text("")
+    runner = DummyRunner({"streams": []})
+    create_video_thumbnail(str(inp), str(tmp_path / "t.jpg"), runner=runner)
+    convert_to_hls(str(inp), str(tmp_path / "hls"), "base", runner=runner)
+    for cmd in runner.commands:
+        head = cmd[:cmd.index("-i")]
+        assert "-nostats" in head
+        assert head[head.index("-loglevel") + 1] == "error"